@@ -0,0 +1,370 @@
+"""MyClip 性能基准测试
+
+在 Qt offscreen 平台下用合成数据测量热点路径，结果以 JSON 输出，便于不同版本间对比:
+
+    python bench.py --sizes 1000,10000,100000 --output bench.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import platform
+import argparse
+import contextlib
+import subprocess
+import tempfile
+import statistics
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt6.QtWidgets import QApplication
+from PyQt6.QtCore import QSettings, QT_VERSION_STR
+from PyQt6.QtGui import QImage, QColor, QPainter
+
+WORDS = ["clipboard", "history", "search", "image", "pinned", "python", "sqlite", "window",
+         "error", "warning", "request", "response", "timeout", "config", "token", "release"]
+CJK_WORDS = ["剪贴板", "历史记录", "搜索", "图片", "固定", "中文测试", "数据库", "主题", "热键", "文件"]
+QUERIES = ["clip", "sqlite", "中文", "中文测试", "历史记录", "error 42", "no-such-text", "a"]
+
+
+# 在独立进程中测量冷启动：导入 main 的耗时、构造完成后首个事件循环周期（托盘已显示）、
+# 以及分阶段启动全部完成的时间，均从进程内第一条语句起算
+STARTUP_PROBE = r"""
+import os, sys, time, json, contextlib
+t0 = time.perf_counter()
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, sys.argv[1])
+with contextlib.redirect_stdout(sys.stderr):
+    import main
+t_import = time.perf_counter()
+from PyQt6.QtCore import QSettings
+for fmt in (QSettings.Format.NativeFormat, QSettings.Format.IniFormat):
+    QSettings.setPath(fmt, QSettings.Scope.UserScope, sys.argv[2])
+app = main.QApplication(sys.argv[:1])
+app.setQuitOnLastWindowClosed(False)
+win = main.ClipboardManager(os.path.join(sys.argv[2], "startup.db"))
+app.processEvents()
+t_tray = time.perf_counter()
+# 首屏列表在写线程初始化数据库后由 database_ready 信号填充
+while getattr(win, "startup_stages", None) or not win.db.ready.is_set():
+    app.processEvents()
+app.processEvents()
+t_ready = time.perf_counter()
+win.stop_workers()
+win.hk_thread.stop()
+print(json.dumps({"import": t_import - t0, "tray": t_tray - t0, "ready": t_ready - t0}))
+"""
+
+
+def percentile(values, pct):
+    if not values: return 0.0
+    values = sorted(values)
+    k = min(len(values) - 1, max(0, int(round(pct / 100.0 * (len(values) - 1)))))
+    return values[k]
+
+
+def summarize(samples):
+    return {
+        "count": len(samples),
+        "p50_ms": round(percentile(samples, 50) * 1000, 3),
+        "p99_ms": round(percentile(samples, 99) * 1000, 3),
+        "mean_ms": round(statistics.fmean(samples) * 1000, 3) if samples else 0.0,
+    }
+
+
+def make_text(rng):
+    kind = rng.random()
+    if kind < 0.5:
+        n = rng.randint(3, 40)
+        return " ".join(rng.choice(WORDS) for _ in range(n)) + f" {rng.randint(0, 99999)}"
+    if kind < 0.8:
+        n = rng.randint(2, 30)
+        return "".join(rng.choice(CJK_WORDS) for _ in range(n)) + str(rng.randint(0, 99999))
+    # 日志类长文本
+    lines = rng.randint(20, 400)
+    return "\n".join(f"[{i:05d}] {rng.choice(WORDS)} {rng.choice(WORDS)} code={rng.randint(0, 999)}"
+                     for i in range(lines))
+
+
+def make_image(rng, size=64):
+    img = QImage(size, size, QImage.Format.Format_ARGB32)
+    img.fill(QColor(rng.randint(0, 255), rng.randint(0, 255), rng.randint(0, 255)))
+    for _ in range(16):
+        img.setPixelColor(rng.randrange(size), rng.randrange(size), QColor(rng.randint(0, 0xFFFFFF)))
+    return img
+
+
+def make_screenshot(rng, w=1920, h=1080):
+    # 大面积纯色 + 少量文字，近似窗口截图
+    img = QImage(w, h, QImage.Format.Format_ARGB32)
+    img.fill(QColor("#f3f3f3"))
+    p = QPainter(img)
+    for _ in range(40):
+        p.fillRect(rng.randrange(w), rng.randrange(h), rng.randint(40, 400), rng.randint(20, 200),
+                   QColor(rng.randint(0, 255), rng.randint(0, 255), rng.randint(0, 255)))
+    for y in range(20, h, 24):
+        p.drawText(20, y, " ".join(rng.choice(WORDS) for _ in range(12)))
+    p.end()
+    return img
+
+
+def make_photo(rng, w=1920, h=1080):
+    # 平滑渐变叠加噪声，近似照片
+    data = bytearray(w * h * 4)
+    for y in range(h):
+        base = y * w * 4
+        for x in range(0, w, 4):
+            v = (x * 255 // w + rng.randint(-12, 12)) & 0xFF
+            data[base + x * 4:base + x * 4 + 16] = bytes((v, (v + y) & 0xFF, y * 255 // h, 255)) * 4
+    return QImage(bytes(data), w, h, w * 4, QImage.Format.Format_ARGB32).copy()
+
+
+def bench_image_codecs(main, seed):
+    rng = random.Random(seed)
+    result = {}
+    for name, img in (("screenshot", make_screenshot(rng)), ("photo", make_photo(rng))):
+        per_codec = {"auto_choice": main.choose_image_codec(img),
+                     "compact_choice": main.compact_image_codec(img)}
+        for codec in main.IMAGE_CODECS[1:]:
+            if codec == 'webp' and not main.webp_supported(): continue
+            enc, dec = [], []
+            for _ in range(3):
+                t0 = time.perf_counter()
+                data, _ = main.encode_image(img, codec)
+                enc.append(time.perf_counter() - t0)
+                t0 = time.perf_counter()
+                main.decode_image(data)
+                dec.append(time.perf_counter() - t0)
+            per_codec[codec] = {"bytes": len(data), "encode": summarize(enc), "decode": summarize(dec)}
+        result[name] = per_codec
+    return result
+
+
+def make_snapshot(rng, i):
+    r = rng.random()
+    if r < 0.70:
+        return {'type': 'text', 'text': make_text(rng)}
+    if r < 0.85:
+        text = make_text(rng)
+        return {'type': 'html', 'text': text, 'html': f"<p>{text}</p>"}
+    if r < 0.95:
+        count = 1 if rng.random() < 0.8 else rng.randint(2, 20)
+        return {'type': 'file', 'paths': [os.path.join("C:\\Users\\bench", f"{rng.choice(WORDS)}_{i}_{k}.txt")
+                                          for k in range(count)]}
+    return {'type': 'image', 'image': make_image(rng)}
+
+
+def bench_startup(workdir, runs=5):
+    here = os.path.dirname(os.path.abspath(__file__))
+    startup_dir = os.path.join(workdir, "startup")
+    os.makedirs(startup_dir, exist_ok=True)
+    samples = {"import": [], "tray": [], "ready": [], "process": []}
+    # 第一次运行会新建数据库，之后与开机自启一样打开已有的库
+    for _ in range(runs + 1):
+        t0 = time.perf_counter()
+        out = subprocess.run([sys.executable, "-c", STARTUP_PROBE, here, startup_dir],
+                             capture_output=True, text=True, check=True).stdout
+        elapsed = time.perf_counter() - t0
+        data = json.loads(out.strip().splitlines()[-1])
+        data["process"] = elapsed
+        for key in samples:
+            samples[key].append(data[key])
+    return {key: summarize(values[1:]) for key, values in samples.items()}
+
+
+def bench_ipc(main, workdir, runs=10):
+    # 以独立进程运行 main.py，经本地命令通道测量命令往返与“再次启动”转发命令后退出的耗时
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+    ipc_dir = os.path.join(workdir, "ipc")
+    os.makedirs(ipc_dir, exist_ok=True)
+    db_path = os.path.join(ipc_dir, "clipboard.db")
+    name = main.instance_name(db_path)
+    env = dict(os.environ, QT_QPA_PLATFORM=os.environ.get("QT_QPA_PLATFORM", "offscreen"),
+               XDG_CONFIG_HOME=ipc_dir)
+    proc = subprocess.Popen([sys.executable, script, "--db", db_path], env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    result = {}
+    try:
+        deadline = time.perf_counter() + 30
+        while main.send_instance_command(name, "ping", 100) is None:
+            if proc.poll() is not None or time.perf_counter() > deadline:
+                raise RuntimeError("MyClip instance did not start")
+            time.sleep(0.05)
+        for command in ("ping", "show", "search clip", "hide"):
+            samples = []
+            for _ in range(runs):
+                t0 = time.perf_counter()
+                main.send_instance_command(name, command)
+                samples.append(time.perf_counter() - t0)
+            result[command.split()[0]] = summarize(samples)
+        samples = []
+        for _ in range(runs):
+            t0 = time.perf_counter()
+            subprocess.run([sys.executable, script, "--db", db_path, "hide"], env=env,
+                           capture_output=True, check=True, timeout=30)
+            samples.append(time.perf_counter() - t0)
+        result["second_launch"] = summarize(samples)
+    finally:
+        main.send_instance_command(name, "quit")
+        try:
+            proc.wait(10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+    result["single_instance"] = main.send_instance_command(name, "ping", 100) is None
+    return result
+
+
+def db_bytes(path):
+    return sum(os.path.getsize(p) for p in (path, path + "-wal") if os.path.exists(p))
+
+
+def pump(app, seconds=0.0):
+    end = time.perf_counter() + seconds
+    app.processEvents()
+    while time.perf_counter() < end:
+        app.processEvents()
+        time.sleep(0.005)
+
+
+def bench_size(main, app, size, workdir, seed):
+    rng = random.Random(seed + size)
+    db_path = os.path.join(workdir, f"bench_{size}.db")
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(db_path + suffix): os.remove(db_path + suffix)
+
+    win = main.ClipboardManager(db_path)
+    # 停掉后台线程，避免保留策略在测试过程中清理合成数据
+    win.stop_workers()
+    db = win.db
+    result = {"size": size, "db_bytes_empty": db_bytes(db_path)}
+
+    # 编码不计入 add_item 耗时
+    jobs = [main.CaptureWorker.encode(make_snapshot(rng, i)) for i in range(size)]
+    jobs = [j for j in jobs if j]
+
+    # 单条提交（界面线程的写入路径）
+    single = []
+    for job in jobs[:200]:
+        t0 = time.perf_counter()
+        db.add_item(**job, emit_signal=False)
+        single.append(time.perf_counter() - t0)
+    result["add_item_single"] = summarize(single)
+
+    # 组提交（后台写线程的写入路径）
+    rest = jobs[200:]
+    t0 = time.perf_counter()
+    for start in range(0, len(rest), main.DBWriterThread.BATCH_SIZE):
+        with db.write_batch():
+            for job in rest[start:start + main.DBWriterThread.BATCH_SIZE]:
+                db.add_item(**job, emit_signal=False)
+    elapsed = time.perf_counter() - t0
+    result["add_item_batched_per_sec"] = round(len(rest) / elapsed, 1) if elapsed and rest else None
+
+    db.get_write_conn().execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    result["db_bytes"] = db_bytes(db_path)
+    result["db_bytes_per_item"] = round(result["db_bytes"] / max(1, size), 1)
+
+    per_query = {}
+    all_samples = []
+    for q in QUERIES:
+        samples = []
+        for _ in range(20):
+            t0 = time.perf_counter()
+            db.get_items(limit=main.HistoryModel.PAGE_SIZE, search_query=q)
+            samples.append(time.perf_counter() - t0)
+        per_query[q] = summarize(samples)
+        all_samples.extend(samples)
+    result["get_items_search"] = summarize(all_samples)
+    result["get_items_search_by_query"] = per_query
+
+    win.toggle_visible()
+    pump(app, 0.05)
+    view = win.list_widget
+    samples = []
+    for _ in range(10):
+        t0 = time.perf_counter()
+        win.refresh_list()
+        view.doItemsLayout()
+        view.viewport().grab()
+        samples.append(time.perf_counter() - t0)
+    result["populate_list"] = summarize(samples)
+
+    samples = []
+    for i in range(10):
+        win.resize(win.width() + (40 if i % 2 == 0 else -40), win.height())
+        app.processEvents()
+        t0 = time.perf_counter()
+        win.update_all_list_item_sizes()
+        samples.append(time.perf_counter() - t0)
+    result["update_all_list_item_sizes"] = summarize(samples)
+
+    # 热键唤出到列表首次绘制；隐藏期间有新条目写入，由预排版在后台处理
+    samples = []
+    for i in range(10):
+        win.hide()
+        db.add_item(**main.CaptureWorker.encode(make_snapshot(rng, size + i)))
+        pump(app, 0.15)
+        t0 = time.perf_counter()
+        win.toggle_visible()
+        while win.show_requested_at is not None and time.perf_counter() - t0 < 1:
+            app.processEvents()
+        samples.append(time.perf_counter() - t0)
+    result["hotkey_to_paint"] = summarize(samples)
+
+    win.hide()
+    win.tray.hide()
+    win.hk_thread.stop()
+    win.deleteLater()
+    pump(app)
+    return result
+
+
+def main_entry(argv=None):
+    parser = argparse.ArgumentParser(description="MyClip headless benchmarks")
+    parser.add_argument("--sizes", default="1000,10000,100000",
+                        help="逗号分隔的合成历史条数")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--workdir", default=None, help="数据库存放目录（默认使用临时目录）")
+    parser.add_argument("--output", default=None, help="JSON 结果文件（默认输出到 stdout）")
+    args = parser.parse_args(argv)
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="myclip-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    # 设置也写到临时目录，不影响本机的真实配置
+    QSettings.setPath(QSettings.Format.NativeFormat, QSettings.Scope.UserScope, workdir)
+    QSettings.setPath(QSettings.Format.IniFormat, QSettings.Scope.UserScope, workdir)
+
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    app.setQuitOnLastWindowClosed(False)
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    # 非 Windows 平台导入时的依赖提示不应混入 JSON 输出
+    with contextlib.redirect_stdout(sys.stderr):
+        import main
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "qt": QT_VERSION_STR,
+        "sqlite": main.sqlite3.sqlite_version,
+        "qpa": os.environ.get("QT_QPA_PLATFORM"),
+        "results": [],
+    }
+    report["startup"] = bench_startup(workdir)
+    report["ipc"] = bench_ipc(main, workdir)
+    report["image_codecs"] = bench_image_codecs(main, args.seed)
+    for size in [int(s) for s in args.sizes.split(",") if s.strip()]:
+        report["results"].append(bench_size(main, app, size, workdir, args.seed))
+
+    data = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(data)
+    else:
+        print(data)
+
+
+if __name__ == "__main__":
+    main_entry()
@@ -1,41 +1,38 @@
 import sys
 import os
 import sqlite3
+import hashlib
 import time
+import queue
+import threading
+import json
+import bisect
+import math
+import functools
+from contextlib import contextmanager, nullcontext
 import re
+from collections import OrderedDict, deque
 import ctypes
-import winreg
 from ctypes import wintypes
 import datetime
+import argparse
+import getpass
+import zlib
+import codecs
+import struct
 
-# ==========================================
-# 依赖库检查
-# ==========================================
+# 非 Windows 平台（如基准测试的 offscreen 环境）没有注册表
 try:
-    import win32gui
-    import win32con
-    import win32api
-    import win32process
-    import win32clipboard
+    import winreg
 except ImportError:
-    print("错误：缺少 pywin32 库。请运行 'pip install pywin32'")
-    pass
-
-from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
-                             QHBoxLayout, QPushButton, QLabel, QListWidget, 
-                             QListWidgetItem, QLineEdit, QStackedWidget,
-                             QSystemTrayIcon, QMenu, QFrame, QGraphicsDropShadowEffect,
-                             QFileIconProvider, QAbstractItemView, QSpinBox, 
-                             QKeySequenceEdit, QSizePolicy, QGroupBox, QCheckBox)
-from PyQt6.QtCore import (Qt, QPoint, QTimer, QSettings, QBuffer, QIODevice, 
-                          QFileInfo, pyqtSignal, QSize, QThread, QRect, 
-                          QPropertyAnimation, QEasingCurve, QEvent, QMimeData, QUrl, QObject)
-from PyQt6.QtGui import (QIcon, QColor, QPixmap, QImage, QKeySequence, 
-                         QCursor, QAction, QFont, QFontMetrics, QPainter)
+    winreg = None
 
 # ==========================================
-# 0. 路径与工具函数
+# 路径与单实例检查
 # ==========================================
+# 再次启动时在导入界面模块之前就把命令转发给正在运行的实例并退出，这个进程只需加载 QtCore/QtNetwork
+from PyQt6.QtNetwork import QLocalServer, QLocalSocket
+
 def get_asset_path(filename):
     if getattr(sys, 'frozen', False):
         base_path = sys._MEIPASS
@@ -50,10 +47,475 @@ def get_data_path(filename):
         base_path = os.path.dirname(os.path.abspath(__file__))
     return os.path.join(base_path, filename)
 
-def create_tinted_icon(svg_path, color_hex):
+def instance_name(db_path):
+    # 按用户和数据库区分：同一个库只允许一个实例写入
+    key = f"{getpass.getuser()}\0{os.path.normcase(os.path.abspath(db_path))}"
+    return "MyClip-" + hashlib.blake2b(key.encode("utf-8"), digest_size=8).hexdigest()
+
+def send_instance_command(name, command, timeout_ms=1000):
+    """发送一条命令并等待应答，返回应答文本；没有正在运行的实例时返回 None"""
+    sock = QLocalSocket()
+    sock.connectToServer(name)
+    if not sock.waitForConnected(timeout_ms): return None
+    sock.write((command + "\n").encode("utf-8"))
+    sock.waitForBytesWritten(timeout_ms)
+    reply = b""
+    while not reply.endswith(b"\n") and sock.waitForReadyRead(timeout_ms):
+        reply += bytes(sock.readAll())
+    sock.disconnectFromServer()
+    return reply.decode("utf-8", "replace").strip()
+
+def forward_command(name, command, retries=0, interval=0.1, timeout_ms=10000):
+    """把命令交给正在运行的实例，返回本进程的退出码；始终没有实例应答时返回 None
+    正在启动的实例要等事件循环开始后才应答，等待应答的时间比连接超时长"""
+    for attempt in range(retries + 1):
+        if attempt: time.sleep(interval)
+        reply = send_instance_command(name, command, timeout_ms)
+        if reply is not None: return 0 if reply == "ok" else 1
+    return None
+
+INSTANCE_COMMANDS = ('show', 'search', 'hide', 'ping', 'quit')
+
+def parse_args(argv=None):
+    # 不接受 Qt 的命令行选项（如 -platform 的取值会被当成命令），需要时用 QT_QPA_PLATFORM 等环境变量
+    parser = argparse.ArgumentParser(description="MyClip 剪贴板历史")
+    parser.add_argument("--db", default="clipboard.db", help="数据库文件（相对路径位于程序目录）")
+    parser.add_argument("command", nargs="*",
+                        help="发给正在运行的实例的命令：show（默认）、search <文本>、hide、quit")
+    args = parser.parse_args(argv)
+    if args.command and args.command[0] not in INSTANCE_COMMANDS:
+        parser.error(f"未知命令 {args.command[0]!r}（可用：{', '.join(INSTANCE_COMMANDS)}）")
+    return args
+
+if __name__ == "__main__":
+    args = parse_args()
+    channel_name = instance_name(get_data_path(args.db))
+    instance_command = " ".join(args.command) or "show"
+    exit_code = forward_command(channel_name, instance_command)
+    if exit_code is not None:
+        sys.exit(exit_code)
+
+from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
+                             QHBoxLayout, QPushButton, QLabel, QListView, 
+                             QLineEdit, QStackedWidget, QStyledItemDelegate, QStyle,
+                             QSystemTrayIcon, QMenu, QGraphicsDropShadowEffect,
+                             QFileIconProvider, QAbstractItemView, QSpinBox, 
+                             QKeySequenceEdit, QGroupBox, QCheckBox, QFileDialog, QScrollArea,
+                             QComboBox)
+from PyQt6.QtCore import (Qt, QPoint, QPointF, QTimer, QSettings, QBuffer, QIODevice, 
+                          QFileInfo, pyqtSignal, QSize, QThread, QRect, 
+                          QPropertyAnimation, QEasingCurve, QEvent, QMimeData, QUrl, QObject,
+                          QAbstractListModel, QModelIndex, QPersistentModelIndex, QLockFile)
+from PyQt6.QtGui import (QIcon, QColor, QPixmap, QImage, QKeySequence, 
+                         QCursor, QAction, QFont, QFontMetrics, QFontMetricsF, QPainter,
+                         QTextLayout, QTextOption, QTextCharFormat, QImageWriter, QImageReader)
+
+# ==========================================
+# 依赖库检查
+# ==========================================
+# pywin32 只在模拟粘贴时使用，首次粘贴时才导入，缩短开机自启的冷启动时间；
+# 热键线程只用到两个消息常量，直接定义
+WM_HOTKEY = 0x0312
+WM_QUIT = 0x0012
+
+@functools.lru_cache(maxsize=None)
+def load_win32():
+    try:
+        import win32api
+        import win32con
+    except ImportError:
+        print("错误：缺少 pywin32 库。请运行 'pip install pywin32'")
+        return None, None
+    return win32api, win32con
+
+# ==========================================
+# 0. 工具函数
+# ==========================================
+class PerfMonitor:
+    """热点路径计时。关闭时 span()/timed() 只多一次属性判断，开启后记录到环形缓冲区与直方图"""
+    # 直方图桶上界（毫秒），最后一个桶收纳更慢的样本
+    BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, float('inf'))
+
+    def __init__(self, capacity=4096):
+        self.enabled = False
+        self.epoch = time.perf_counter()
+        self.events = deque(maxlen=capacity)    # (name, start_s, duration_s, thread_id)
+        self.stats = {}                         # name -> [count, total_s, max_s, buckets]
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def _span(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, start, time.perf_counter() - start)
+
+    def span(self, name):
+        return self._span(name) if self.enabled else nullcontext()
+
+    def timed(self, name):
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled: return fn(*args, **kwargs)
+                with self._span(name):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def record(self, name, start, duration):
+        ms = duration * 1000
+        with self.lock:
+            self.events.append((name, start, duration, threading.get_ident()))
+            st = self.stats.get(name)
+            if st is None:
+                st = self.stats[name] = [0, 0.0, 0.0, [0] * len(self.BUCKETS_MS)]
+            st[0] += 1
+            st[1] += duration
+            st[2] = max(st[2], duration)
+            st[3][bisect.bisect_left(self.BUCKETS_MS, ms)] += 1
+
+    def count(self, name, n=1):
+        if not self.enabled: return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def reset(self):
+        with self.lock:
+            self.events.clear()
+            self.stats.clear()
+            self.counters.clear()
+
+    def _quantile(self, buckets, total, q):
+        target = q * total
+        seen = 0
+        for bound, n in zip(self.BUCKETS_MS, buckets):
+            seen += n
+            if seen >= target: return bound
+        return self.BUCKETS_MS[-1]
+
+    def summary(self):
+        with self.lock:
+            stats = {k: (v[0], v[1], v[2], list(v[3])) for k, v in self.stats.items()}
+            counters = dict(self.counters)
+        result = {}
+        for name, (n, total, mx, buckets) in sorted(stats.items()):
+            result[name] = {'count': n, 'mean_ms': round(total / n * 1000, 3), 'max_ms': round(mx * 1000, 3),
+                            'p50_ms': self._quantile(buckets, n, 0.5), 'p99_ms': self._quantile(buckets, n, 0.99)}
+        return {'spans': result, 'counters': counters}
+
+    def export_trace(self, path):
+        # Chrome trace-event 格式，可在 chrome://tracing 或 Perfetto 中打开
+        with self.lock:
+            events = list(self.events)
+        pid = os.getpid()
+        trace = [{'name': name, 'ph': 'X', 'pid': pid, 'tid': tid,
+                  'ts': round((start - self.epoch) * 1e6, 1), 'dur': round(duration * 1e6, 1)}
+                 for name, start, duration, tid in events]
+        summary = self.summary()
+        summary['spans'] = {k: {kk: (None if vv == float('inf') else vv) for kk, vv in v.items()}
+                            for k, v in summary['spans'].items()}
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': trace, 'displayTimeUnit': 'ms', 'summary': summary}, f, ensure_ascii=False)
+
+perf = PerfMonitor()
+
+def blob_digest(data):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+TEXT_CHUNK_CHARS = 1 << 20
+
+def utf8_chunks(text, normalize_newlines=False):
+    """分段编码长文本，不生成整段 bytes 副本；可顺带把 CRLF 统一为 LF"""
+    carry = ""
+    for start in range(0, len(text), TEXT_CHUNK_CHARS):
+        chunk = carry + text[start:start + TEXT_CHUNK_CHARS]
+        carry = ""
+        if normalize_newlines:
+            # \r\n 可能被切在两段之间
+            if chunk.endswith("\r"): chunk, carry = chunk[:-1], "\r"
+            chunk = chunk.replace("\r\n", "\n")
+        yield chunk.encode("utf-8", "surrogatepass")
+    if carry: yield carry.encode()
+
+# 去重摘要必须跨进程稳定，不能使用每次启动随机化的内置 hash()
+# 文件条目的 content 是换行分隔的路径列表，按排序后的规范路径求摘要，复制顺序不同也视为同一组；
+# 单个文件的结果与旧版相同
+def content_hash(type_, content):
+    h = hashlib.blake2b(digest_size=16)
+    h.update(type_.encode() + b"\0")
+    if type_ == 'file':
+        content = "\n".join(sorted(os.path.normcase(os.path.normpath(p)) for p in content.split("\n")))
+    if isinstance(content, str):
+        for chunk in utf8_chunks(content, normalize_newlines=True): h.update(chunk)
+    else:
+        h.update(content)
+    return h.hexdigest()
+
+def image_hash(img):
+    # 对像素而不是编码结果求摘要，编码参数变化不影响去重
+    img = img.convertToFormat(QImage.Format.Format_ARGB32)
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"image\0{img.width()}x{img.height()}\0".encode())
+    bits = img.constBits()
+    bits.setsize(img.sizeInBytes())
+    h.update(bits)
+    return h.hexdigest()
+
+# 超过阈值的正文压缩后以 BLOB 存入原来的 TEXT 列，首字节标明格式
+COMPRESS_MIN_BYTES = 4096
+PACK_ZLIB_V1 = b"\x01"
+# 共享字典：剪贴板里常见的 HTML 片段与日志词汇，小段内容也能压出不错的比例。
+# 修改内容必须同时换一个新的格式字节，否则已有记录无法解压
+TEXT_ZDICT = (
+    b'Traceback (most recent call last):\n  File "", line , in \nERROR WARNING INFO DEBUG Exception: '
+    b'<pre><code></code></pre><ul><li></li></ul><table><tbody><tr><td></td></tr></tbody></table>'
+    b'<img src="data:image/png;base64,<a href="https://www.&nbsp;&amp;&lt;&gt;&quot; class="" id="'
+    b'<p style="margin:0px;"></p><br><br/><div class="" style=""></div><span style="font-family:'
+    b'; font-size:14px; font-weight:700; color:rgb(0, 0, 0); background-color:rgb(255, 255, 255);">'
+    b'</span><html><head><meta charset="utf-8"><meta http-equiv="Content-Type" content="text/html; '
+    b'charset=utf-8"><style type="text/css"></style></head><body>\n<!--StartFragment--><!--EndFragment-->'
+    b'</body>\n</html>'
+)
+
+def pack_text(text):
+    """写库前调用：短文本原样返回，长文本返回带格式字节的压缩数据"""
+    if not text: return text
+    if len(text) < COMPRESS_MIN_BYTES and len(text.encode("utf-8", "surrogatepass")) < COMPRESS_MIN_BYTES:
+        return text
+    # 分段压缩，峰值内存只多出压缩结果本身
+    co = zlib.compressobj(6, zdict=TEXT_ZDICT)
+    parts = [PACK_ZLIB_V1]
+    raw_size = 0
+    for chunk in utf8_chunks(text):
+        raw_size += len(chunk)
+        parts.append(co.compress(chunk))
+    parts.append(co.flush())
+    packed = b"".join(parts)
+    return packed if len(packed) < raw_size else text
+
+def unpack_text(value):
+    if not isinstance(value, bytes): return value
+    if value[:1] != PACK_ZLIB_V1: raise ValueError(f"unknown text format {value[:1]!r}")
+    do = zlib.decompressobj(zdict=TEXT_ZDICT)
+    return (do.decompress(value[1:]) + do.flush()).decode("utf-8", "surrogatepass")
+
+# 列表查询只取压缩正文的开头若干字节，解压出的前缀足够列表显示
+PREVIEW_HEAD_BYTES = 4096
+PREVIEW_CHARS = 2048
+
+def unpack_text_head(value, max_chars=PREVIEW_CHARS):
+    """只解压截断的压缩数据开头，返回原文（未经规范化）的前 max_chars 个字符"""
+    if value[:1] != PACK_ZLIB_V1: raise ValueError(f"unknown text format {value[:1]!r}")
+    raw = zlib.decompressobj(zdict=TEXT_ZDICT).decompress(value[1:], max_chars * 4)
+    # 末尾可能截在多字节字符中间，增量解码器会保留这部分不输出
+    return codecs.getincrementaldecoder("utf-8")("surrogatepass").decode(raw)[:max_chars]
+
+# search_text 只用于检索：统一换行、合并空白并截断长度，不再是正文的完整副本
+SEARCH_TEXT_LIMIT = 8192
+FILE_SEARCH_TEXT_LIMIT = 256 * 1024     # 多文件条目要索引每个文件名，上限放宽
+SEARCH_SPACES_RE = re.compile(r"[ \t\f\v\u00a0\u3000]+")
+SEARCH_BLANK_LINES_RE = re.compile(r" ?\n[\n ]*")
+
+def search_index_text(text, limit=SEARCH_TEXT_LIMIT):
+    # 先粗截一段再做正则替换，超长内容也不会全文扫描
+    text = (text or "")[:limit * 2].replace("\r\n", "\n").replace("\r", "\n")
+    text = SEARCH_BLANK_LINES_RE.sub("\n", SEARCH_SPACES_RE.sub(" ", text))
+    return text.strip()[:limit]
+
+def preview_text(row):
+    # 列表行里压缩存储的正文为 None，改为解压 content_head 得到原文开头；
+    # 解压结果写回行内，重绘时不再重复解压
+    if row['content_text'] is not None: return row['content_text']
+    head = row.get('content_head')
+    if head is None: return row['search_text'] or ""
+    if isinstance(head, bytes):
+        head = row['content_head'] = unpack_text_head(head)
+    return head
+
+def file_search_text(filepath):
+    # 多个文件时第一个保留完整路径（列表显示与图标用），其余只索引文件名，检索文本上限内可容纳更多文件
+    paths = filepath.split("\n")
+    return "\n".join(paths[:1] + [os.path.basename(p) for p in paths[1:]])
+
+def file_label(row):
+    """文件条目在列表中显示的名称与第一个文件的路径"""
+    path = preview_text(row).split("\n", 1)[0]
+    count = row.get('file_count') or 1
+    name = os.path.basename(path)
+    return (f"{name} 等 {count} 个文件" if count > 1 else name), path
+
+def file_metadata(paths):
+    """一次遍历取得各文件的 {路径: [大小, 修改时间]}，不存在或无法访问的记为 null，返回 JSON"""
+    meta = {}
+    for path in paths:
+        try:
+            st = os.stat(path)
+            meta[path] = [st.st_size, int(st.st_mtime)]
+        except OSError:
+            meta[path] = None
+    return json.dumps(meta, ensure_ascii=False, separators=(",", ":"))
+
+# 中日韩文字之间没有空格，与其他文字相邻处也当作关键词分隔
+CJK_RANGES = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff"
+SEARCH_TERM_RE = re.compile(f"[{CJK_RANGES}]+|[^\\s{CJK_RANGES}]+")
+
+def search_terms(query):
+    """把搜索框内容拆成关键词（去重、保持顺序），各关键词之间是“且”的关系"""
+    return list(dict.fromkeys(SEARCH_TERM_RE.findall(query or "")))
+
+class SearchMatcher:
+    """每个查询编译一次，列表过滤、高亮和摘要共用"""
+    def __init__(self, query=""):
+        self.query = query or ""
+        self.terms = search_terms(self.query)
+        self.folded = [t.casefold() for t in self.terms]
+        # 长词优先，避免较短的关键词抢先匹配同一位置
+        alternation = "|".join(re.escape(t) for t in sorted(self.terms, key=len, reverse=True))
+        self.pattern = re.compile(alternation, re.IGNORECASE) if self.terms else None
+
+    def __bool__(self):
+        return self.pattern is not None
+
+    def matches(self, text):
+        folded = (text or "").casefold()
+        return all(t in folded for t in self.folded)
+
+    def covers(self, other):
+        """other 的每条结果是否必然也是本查询的结果（例如 "abc" 之于 "abcd"）"""
+        return bool(self) and all(any(t in o for o in other.folded) for t in self.folded)
+
+    def spans(self, text):
+        """所有命中位置 [(start, end), ...]"""
+        return [m.span() for m in self.pattern.finditer(text)] if self.pattern else []
+
+    def snippet(self, text, max_chars, context=40):
+        """截取最多 max_chars 个字符用于显示；第一个命中不在开头部分时，从它前面一点的行首开始截取"""
+        m = self.pattern.search(text) if self.pattern else None
+        if not m or m.end() <= max_chars - context:
+            return text[:max_chars]
+        start = max(0, m.start() - context)
+        line_start = text.rfind("\n", start, m.start())
+        if line_start >= 0: start = line_start + 1
+        return "…" + text[start:start + max_chars]
+
+# 图片编码：
+#   raw      预乘 ARGB 原始像素 + zlib(1)，编码最快，粘贴时也无需图片解码
+#   png-fast PNG 低压缩级别；png 为 Qt 默认级别
+#   webp     WebP 无损，体积最小但编码较慢
+#   auto     小图直接存 PNG；大图先存 raw，移出最近条目后由采集线程空闲时转成紧凑格式
+IMAGE_CODECS = ('auto', 'png-fast', 'png', 'webp', 'raw')
+SMALL_IMAGE_PIXELS = 256 * 256
+RAW_IMAGE_HEADER = struct.Struct("<4sIII")     # magic, width, height, bytes per line
+RAW_IMAGE_MAGIC = b"QRAW"
+
+@functools.lru_cache(maxsize=None)
+def webp_supported():
+    return b"webp" in [bytes(f) for f in QImageWriter.supportedImageFormats()]
+
+def is_flat_image(img):
+    # 缩到 64x64 后颜色很少，多半是截图、图表一类的平面内容
+    small = img.scaled(64, 64, Qt.AspectRatioMode.IgnoreAspectRatio,
+                       Qt.TransformationMode.FastTransformation).convertToFormat(QImage.Format.Format_ARGB32)
+    bits = small.constBits()
+    bits.setsize(small.sizeInBytes())
+    return len(set(memoryview(bits).cast("I"))) <= 256
+
+def choose_image_codec(img, preferred='auto'):
+    if preferred != 'auto': return preferred
+    return 'png' if img.width() * img.height() <= SMALL_IMAGE_PIXELS else 'raw'
+
+def compact_image_codec(img):
+    if webp_supported(): return 'webp'
+    return 'png-fast' if is_flat_image(img) else 'png'
+
+def encode_image(img, codec):
+    """返回 (数据, 实际使用的编码)"""
+    if codec == 'raw':
+        img = img.convertToFormat(QImage.Format.Format_ARGB32_Premultiplied)
+        bits = img.constBits()
+        bits.setsize(img.sizeInBytes())
+        pixels = memoryview(bits)
+        # 分段压缩，不复制整块像素数据
+        co = zlib.compressobj(1)
+        parts = [RAW_IMAGE_HEADER.pack(RAW_IMAGE_MAGIC, img.width(), img.height(), img.bytesPerLine())]
+        for start in range(0, len(pixels), 1 << 22):
+            parts.append(co.compress(pixels[start:start + (1 << 22)]))
+        parts.append(co.flush())
+        return b"".join(parts), 'raw'
+    if codec == 'webp' and not webp_supported(): codec = 'png-fast'
+    ba = QBuffer()
+    ba.open(QIODevice.OpenModeFlag.WriteOnly)
+    if codec == 'webp':
+        img.save(ba, "WEBP", 100)   # quality 100 即无损
+    else:
+        # PNG 的 quality 对应 zlib 压缩级别，80 约为级别 1
+        img.save(ba, "PNG", 80 if codec == 'png-fast' else -1)
+    return ba.data().data(), codec
+
+def decode_image(data):
+    if data and data[:4] == RAW_IMAGE_MAGIC:
+        _, w, h, bpl = RAW_IMAGE_HEADER.unpack_from(data)
+        pixels = zlib.decompress(memoryview(data)[RAW_IMAGE_HEADER.size:])
+        return QImage(pixels, w, h, bpl, QImage.Format.Format_ARGB32_Premultiplied).copy()
+    return QImage.fromData(data)
+
+# 列表缩略图的最大尺寸，与列表项的最大高度对应
+THUMB_MAX_WIDTH = 320
+THUMB_MAX_HEIGHT = 110
+
+def make_thumbnail(img):
+    # 只在采集时执行一次，结果随图片一起持久化
+    if img.height() > THUMB_MAX_HEIGHT:
+        img = img.scaledToHeight(THUMB_MAX_HEIGHT, Qt.TransformationMode.SmoothTransformation)
+    if img.width() > THUMB_MAX_WIDTH:
+        img = img.scaledToWidth(THUMB_MAX_WIDTH, Qt.TransformationMode.SmoothTransformation)
+    ba = QBuffer()
+    ba.open(QIODevice.OpenModeFlag.WriteOnly)
+    img.save(ba, "PNG")
+    return ba.data().data()
+
+class PixmapCache:
+    """已解码缩略图的 LRU 缓存，按像素字节数限制总大小"""
+    def __init__(self, max_bytes=32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.items = OrderedDict()
+
+    @staticmethod
+    def cost(pix):
+        return pix.width() * pix.height() * 4
+
+    def get(self, key):
+        pix = self.items.get(key)
+        if pix is not None:
+            self.items.move_to_end(key)
+        return pix
+
+    def put(self, key, pix):
+        if key in self.items:
+            self.total_bytes -= self.cost(self.items.pop(key))
+        self.items[key] = pix
+        self.total_bytes += self.cost(pix)
+        while self.total_bytes > self.max_bytes and len(self.items) > 1:
+            _, old = self.items.popitem(last=False)
+            self.total_bytes -= self.cost(old)
+
+thumb_cache = PixmapCache()
+# 文件图标：普通文件按扩展名共用，可执行文件与快捷方式按路径
+file_icon_cache = PixmapCache(2 * 1024 * 1024)
+
+# 着色结果按 (图标, 颜色, 尺寸) 缓存，切换主题时不再重新读取和绘制 SVG
+# size: (宽, 高)，按目标尺寸栅格化 SVG；为 None 时使用 SVG 自身尺寸
+@functools.lru_cache(maxsize=64)
+def create_tinted_icon(svg_path, color_hex, size=None):
     if not os.path.exists(svg_path):
         return QIcon()
-    src_pixmap = QPixmap(svg_path)
+    reader = QImageReader(svg_path)
+    if size: reader.setScaledSize(QSize(*size))
+    src_pixmap = QPixmap.fromImage(reader.read())
     if src_pixmap.isNull():
         return QIcon()
     tgt_pixmap = QPixmap(src_pixmap.size())
@@ -82,9 +544,7 @@ QScrollBar::add-line:vertical, QScrollBar::sub-line:vertical { background: none;
 #CloseBtn:hover { background-color: #e81123; }
 QLineEdit { background-color: #2b2b2b; color: white; border: 1px solid #555; border-radius: 4px; padding: 4px; }
 QLineEdit:focus { border: 1px solid #0078d7; }
-QListWidget { background: transparent; border: none; outline: none; }
-#ItemContainer { background-color: #2b2b2b; border: 1px solid #444; }
-#ItemContainer:hover { border: 1px solid transparent; background-color: #333; }
+QListView { background: transparent; border: none; outline: none; }
 QGroupBox { border: 1px solid #555; border-radius: 5px; margin-top: 10px; font-weight: bold; }
 QGroupBox::title { subcontrol-origin: margin; subcontrol-position: top left; padding: 0 3px; color: #aaa; }
 QSpinBox, QKeySequenceEdit { background-color: #333; color: white; border: 1px solid #555; border-radius: 3px; padding: 3px; }
@@ -110,9 +570,7 @@ QScrollBar::add-line:vertical, QScrollBar::sub-line:vertical { background: none;
 #CloseBtn:hover { background-color: #e81123; }
 QLineEdit { background-color: #ffffff; color: #333; border: 1px solid #ccc; border-radius: 4px; padding: 4px; }
 QLineEdit:focus { border: 1px solid #0078d7; }
-QListWidget { background: transparent; border: none; outline: none; }
-#ItemContainer { background-color: #ffffff; border: 1px solid #ccc; }
-#ItemContainer:hover { border: 1px solid transparent; background-color: #fff; }
+QListView { background: transparent; border: none; outline: none; }
 QGroupBox { border: 1px solid #ccc; border-radius: 5px; margin-top: 10px; font-weight: bold; }
 QGroupBox::title { subcontrol-origin: margin; subcontrol-position: top left; padding: 0 3px; color: #333; }
 QSpinBox, QKeySequenceEdit { background-color: white; color: #333; border: 1px solid #ccc; border-radius: 3px; padding: 3px; }
@@ -131,24 +589,103 @@ QMenu::item:selected { background-color: #e5e5e5; }
 # ==========================================
 class GlobalSignals(QObject):
     database_changed = pyqtSignal(str) 
+    # 单条记录的增量变化: (操作, 记录 id)，操作为 insert / bump / delete / pin / unpin
+    history_delta = pyqtSignal(str, int)
+    # 写线程完成建表与迁移，之后才能读取数据库
+    database_ready = pyqtSignal()
+    # 建表或迁移失败（错误信息），数据库保持未就绪，列表不再查询
+    database_failed = pyqtSignal(str)
 
 global_signals = GlobalSignals()
 
 class DBManager:
-    def __init__(self, db_name="clipboard.db"):
+    SCHEMA_VERSION = 4
+
+    # 列表查询只取轻量列，content_html 与图片数据在粘贴时按需加载；
+    # 压缩存储的正文在列表中为 NULL，只取开头一段（content_head）解压后显示
+    LIST_COLUMNS = ("history.id, history.type, "
+                    "CASE WHEN typeof(history.content_text) = 'text' THEN history.content_text END AS content_text, "
+                    "CASE WHEN typeof(history.content_text) = 'blob' "
+                    f"THEN substr(history.content_text, 1, {PREVIEW_HEAD_BYTES}) END AS content_head, "
+                    "history.search_text, history.hash_val, history.is_pinned, history.created_at, "
+                    "history.blob_hash, history.blob_size, history.width, history.height, history.file_count")
+
+    PRAGMAS = (
+        # 新建数据库直接启用增量 vacuum，删除后可以分批回收空间（对已有表的库无效）
+        "PRAGMA auto_vacuum = INCREMENTAL",
+        # WAL: 读取不会被写入阻塞；NORMAL 在 WAL 下仍可保证数据库不损坏
+        "PRAGMA journal_mode = WAL",
+        "PRAGMA synchronous = NORMAL",
+        "PRAGMA cache_size = -16000",
+        "PRAGMA mmap_size = 268435456",
+        "PRAGMA temp_store = MEMORY",
+        "PRAGMA busy_timeout = 5000",
+    )
+
+    # defer_init: 建表与迁移留给写线程执行，完成后 ready 置位并发出 database_ready
+    def __init__(self, db_name="clipboard.db", defer_init=False):
         self.db_path = get_data_path(db_name)
-        self.conn = None
-        self.init_db()
+        self.local = threading.local()
+        self.write_conn = None
+        self.write_lock = threading.RLock()
+        self.batch_depth = 0
+        self.fts_enabled = False
+        self.ready = threading.Event()
+        self.init_error = None
+        if not defer_init: self.init_db()
+
+    def connect(self):
+        # SQL 语句保持固定文本，由连接内的语句缓存复用预编译结果
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, cached_statements=256)
+        conn.row_factory = sqlite3.Row
+        for pragma in self.PRAGMAS:
+            conn.execute(pragma)
+        return conn
 
     def get_conn(self):
-        if not self.conn:
-            self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
-            self.conn.row_factory = sqlite3.Row
-        return self.conn
+        # 读连接按线程分配，与写连接分离
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = self.local.conn = self.connect()
+        return conn
+
+    def get_write_conn(self):
+        if not self.write_conn:
+            self.write_conn = self.connect()
+        return self.write_conn
+
+    @contextmanager
+    def write_batch(self):
+        """写事务：同一写连接由锁串行化，嵌套的写操作合并到最外层一次提交"""
+        with self.write_lock:
+            conn = self.get_write_conn()
+            self.batch_depth += 1
+            ok = False
+            try:
+                yield conn
+                ok = True
+            finally:
+                self.batch_depth -= 1
+                if self.batch_depth == 0:
+                    if ok: conn.commit()
+                    else: conn.rollback()
 
     def init_db(self):
-        conn = self.get_conn()
-        cursor = conn.cursor()
+        with self.write_batch() as conn:
+            cursor = conn.cursor()
+            self.create_schema(cursor)
+        self.ready.set()
+
+    def convert_auto_vacuum(self):
+        # 旧数据库需要一次完整 VACUUM 才能切换到增量模式（仅升级时执行一次），耗时与库大小成正比，
+        # 由写线程在首轮清理之后的空闲时执行；返回是否做了转换
+        with self.write_lock:
+            conn = self.get_write_conn()
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2: return False
+            conn.execute("VACUUM")
+            return True
+
+    def create_schema(self, cursor):
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS history (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -157,60 +694,388 @@ class DBManager:
                 is_pinned INTEGER DEFAULT 0, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         ''')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_search ON history(search_text)')
-        conn.commit()
+        self.init_blob_store(cursor)
+        self.fts_enabled = self.init_fts(cursor)
+        self.migrate(cursor)
+
+    def migrate(self, cursor):
+        version = cursor.execute("PRAGMA user_version").fetchone()[0]
+        if version < 1:
+            self.rehash_history(cursor)
+        if version < 2:
+            # item_size: 记录占用的字节数，供按总大小清理时使用
+            if 'item_size' not in {r['name'] for r in cursor.execute("PRAGMA table_info(history)")}:
+                cursor.execute("ALTER TABLE history ADD COLUMN item_size INTEGER DEFAULT 0")
+            cursor.execute('''
+                UPDATE history SET item_size = COALESCE(length(CAST(content_text AS BLOB)), 0)
+                    + COALESCE(length(CAST(content_html AS BLOB)), 0) + COALESCE(blob_size, 0)
+            ''')
+        if version < 3:
+            # LIKE '%q%' 用不上 search_text 上的索引，它只会让数据库再多存一份检索文本
+            cursor.execute('DROP INDEX IF EXISTS idx_search')
+            self.compress_history(cursor)
+        if version < 4:
+            # 多文件条目：file_count 供列表显示，file_meta 为各文件的大小与修改时间
+            columns = {r['name'] for r in cursor.execute("PRAGMA table_info(history)")}
+            if 'file_count' not in columns:
+                cursor.execute("ALTER TABLE history ADD COLUMN file_count INTEGER")
+            if 'file_meta' not in columns:
+                cursor.execute("ALTER TABLE history ADD COLUMN file_meta TEXT")
+        if version < self.SCHEMA_VERSION:
+            cursor.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+        cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_hash ON history(hash_val)')
+        # 覆盖索引：清理时统计条数/大小和查找最旧记录都不必读取正文
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_prune ON history(is_pinned, created_at, item_size)')
+        # 列表按 (created_at, id) 键集分页
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_recent ON history(created_at DESC, id DESC)')
+
+    def compress_history(self, cursor):
+        # 已有记录改为压缩存储，search_text 重写为规范化后的检索文本（FTS 由触发器同步）
+        ids = [r['id'] for r in cursor.execute("SELECT id FROM history")]
+        for item_id in ids:
+            r = cursor.execute('''
+                SELECT content_text, content_html, search_text, blob_size FROM history WHERE id = ?
+            ''', (item_id,)).fetchone()
+            text, html = unpack_text(r['content_text']), unpack_text(r['content_html'])
+            packed = (pack_text(text), pack_text(html), search_index_text(text))
+            if packed == (r['content_text'], r['content_html'], r['search_text']): continue
+            cursor.execute('''
+                UPDATE history SET content_text = ?, content_html = ?, search_text = ?, item_size = ?
+                WHERE id = ?
+            ''', packed + (self.item_size(packed[0], packed[1], None) + (r['blob_size'] or 0), item_id))
+
+    def rehash_history(self, cursor):
+        # 旧版用 hash() 去重，重启后失效：重新计算稳定摘要，并把重复记录合并到最新的一条
+        rows = cursor.execute('''
+            SELECT id, type, content_text, blob_hash, hash_val, is_pinned FROM history
+            ORDER BY created_at DESC, id DESC
+        ''').fetchall()
+        keep = {}
+        for r in rows:
+            h = self.row_hash(cursor, r)
+            if h in keep:
+                if r['is_pinned']:
+                    cursor.execute("UPDATE history SET is_pinned = 1 WHERE id = ?", (keep[h],))
+                cursor.execute("DELETE FROM history WHERE id = ?", (r['id'],))
+            else:
+                keep[h] = r['id']
+                cursor.execute("UPDATE history SET hash_val = ? WHERE id = ?", (h, r['id']))
+
+    def row_hash(self, cursor, row):
+        if row['type'] == 'image':
+            data = cursor.execute("SELECT data FROM blobs WHERE hash = ?", (row['blob_hash'],)).fetchone()
+            img = decode_image(data['data']) if data else QImage()
+            if not img.isNull(): return image_hash(img)
+            return content_hash('image', row['blob_hash'] or row['hash_val'] or "")
+        return content_hash(row['type'], row['content_text'] or "")
+
+    def init_blob_store(self, cursor):
+        # 图片按内容哈希只存一份，history 行只保留引用、大小和尺寸
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS blobs (
+                hash TEXT PRIMARY KEY, data BLOB, size INTEGER, thumb BLOB
+            )
+        ''')
+        blob_columns = {r['name'] for r in cursor.execute("PRAGMA table_info(blobs)")}
+        if 'thumb' not in blob_columns:
+            cursor.execute("ALTER TABLE blobs ADD COLUMN thumb BLOB")
+        # codec: 图片编码，NULL 为旧版的 PNG
+        if 'codec' not in blob_columns:
+            cursor.execute("ALTER TABLE blobs ADD COLUMN codec TEXT")
+        columns = {r['name'] for r in cursor.execute("PRAGMA table_info(history)")}
+        for name, decl in [('blob_hash', 'TEXT'), ('blob_size', 'INTEGER'),
+                           ('width', 'INTEGER'), ('height', 'INTEGER')]:
+            if name not in columns:
+                cursor.execute(f"ALTER TABLE history ADD COLUMN {name} {decl}")
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_blob_hash ON history(blob_hash)')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS history_blob_ad AFTER DELETE ON history
+            WHEN old.blob_hash IS NOT NULL BEGIN
+                DELETE FROM blobs WHERE hash = old.blob_hash
+                    AND NOT EXISTS (SELECT 1 FROM history WHERE blob_hash = old.blob_hash);
+            END
+        ''')
 
-    # emit_signal: 是否发送信号刷新UI。批量操作或后台静默更新时建议设为 False
-    def add_item(self, type_, text=None, html=None, blob=None, filepath=None, hash_val=None, emit_signal=True):
-        conn = self.get_conn()
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT id FROM history WHERE hash_val = ?", (hash_val,))
-        row = cursor.fetchone()
-        
-        updated = False
-        if row:
-            cursor.execute("UPDATE history SET created_at = CURRENT_TIMESTAMP WHERE id = ?", (row['id'],))
-            updated = True
-            row_id = row['id']
-        else:
-            search_text = text if text else (filepath if filepath else "")
+        # 旧版数据库：把 content_blob 中的图片迁移到 blobs 表
+        rows = cursor.execute("SELECT id FROM history WHERE content_blob IS NOT NULL").fetchall()
+        for r in rows:
+            blob = cursor.execute("SELECT content_blob FROM history WHERE id = ?", (r['id'],)).fetchone()[0]
+            img = QImage.fromData(blob)
+            blob_hash = self.store_blob(cursor, blob, make_thumbnail(img) if not img.isNull() else None)
             cursor.execute('''
-                INSERT INTO history (type, content_text, content_html, content_blob, search_text, hash_val)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (type_, text or filepath, html, blob, search_text, hash_val))
+                UPDATE history SET content_blob = NULL, blob_hash = ?, blob_size = ?, width = ?, height = ?
+                WHERE id = ?
+            ''', (blob_hash, len(blob), img.width() or None, img.height() or None, r['id']))
+
+    @staticmethod
+    def store_blob(cursor, blob, thumb=None, codec=None):
+        blob_hash = blob_digest(blob)
+        cursor.execute("INSERT OR IGNORE INTO blobs (hash, data, size, thumb, codec) VALUES (?, ?, ?, ?, ?)",
+                       (blob_hash, blob, len(blob), thumb, codec))
+        return blob_hash
+
+    def next_raw_blob(self, keep_recent):
+        # 最近 keep_recent 条之外、仍以原始像素存储的一张图片
+        row = self.get_conn().execute('''
+            SELECT hash FROM blobs WHERE codec = 'raw' AND hash NOT IN (
+                SELECT blob_hash FROM (
+                    SELECT blob_hash FROM history ORDER BY created_at DESC, id DESC LIMIT ?)
+                WHERE blob_hash IS NOT NULL)
+            LIMIT 1
+        ''', (keep_recent,)).fetchone()
+        return row['hash'] if row else None
+
+    def replace_blob(self, blob_hash, data, codec):
+        # 重新编码不改变引用用的 hash，只更新数据与各条记录的大小
+        with self.write_batch() as conn:
+            conn.execute("UPDATE blobs SET data = ?, size = ?, codec = ? WHERE hash = ?",
+                         (data, len(data), codec, blob_hash))
+            conn.execute("UPDATE history SET item_size = item_size - COALESCE(blob_size, 0) + ?, blob_size = ? "
+                         "WHERE blob_hash = ?", (len(data), len(data), blob_hash))
+
+    def init_fts(self, cursor):
+        # FTS5 全文索引 (trigram 分词，中文等任意子串均可命中，需要 SQLite >= 3.34)
+        # 外部内容表模式：索引只保存分词结果，正文仍从 history 读取
+        exists = cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'history_fts'").fetchone()
+        try:
+            cursor.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS history_fts USING fts5(
+                    search_text, content='history', content_rowid='id', tokenize='trigram'
+                )
+            ''')
+        except sqlite3.OperationalError as e:
+            print(f"FTS5 不可用，搜索回退到 LIKE: {e}")
+            return False
+
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS history_fts_ai AFTER INSERT ON history BEGIN
+                INSERT INTO history_fts(rowid, search_text) VALUES (new.id, new.search_text);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS history_fts_ad AFTER DELETE ON history BEGIN
+                INSERT INTO history_fts(history_fts, rowid, search_text) VALUES ('delete', old.id, old.search_text);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS history_fts_au AFTER UPDATE OF search_text ON history BEGIN
+                INSERT INTO history_fts(history_fts, rowid, search_text) VALUES ('delete', old.id, old.search_text);
+                INSERT INTO history_fts(rowid, search_text) VALUES (new.id, new.search_text);
+            END
+        ''')
+        # 旧版数据库首次升级：一次性回填已有历史
+        if not exists:
+            cursor.execute("INSERT INTO history_fts(history_fts) VALUES ('rebuild')")
+        return True
+
+    @staticmethod
+    def fts_phrase(term):
+        # 每个关键词作为一个短语，语义与 LIKE '%term%' 一致
+        return '"' + term.replace('"', '""') + '"'
+
+    @staticmethod
+    def like_escape(term):
+        # % 与 _ 按字面匹配（配合 ESCAPE '\'），与内存中 SearchMatcher 的细化结果一致
+        return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+    # emit_signal: 是否发送信号刷新UI。批量操作或后台静默更新时建议设为 False
+    # width/height/thumb: 图片尺寸与缩略图，由调用方从已解码的 QImage 生成，避免再次解码
+    # 在 write_batch() 块内调用时随整批一起提交
+    @perf.timed("add_item")
+    def add_item(self, type_, text=None, html=None, blob=None, filepath=None, hash_val=None, emit_signal=True,
+                 width=None, height=None, thumb=None, codec=None, file_meta=None):
+        with self.write_batch() as conn:
+            row_id, updated = self.upsert_item(conn.cursor(), type_, text, html, blob, filepath, hash_val,
+                                               width, height, thumb, codec, file_meta)
+        if emit_signal:
+            global_signals.history_delta.emit('bump' if updated else 'insert', row_id)
+        return row_id, updated
+
+    # filepath: 换行分隔的一个或多个路径
+    def upsert_item(self, cursor, type_, text, html, blob, filepath, hash_val, width, height, thumb, codec=None,
+                    file_meta=None):
+        # hash_val 上有唯一索引：先尝试插入，冲突时只把已有记录的时间置顶
+        search_text = (search_index_text(file_search_text(filepath), FILE_SEARCH_TEXT_LIMIT) if filepath
+                       else search_index_text(text))
+        stored_text, stored_html = pack_text(text or filepath), pack_text(html)
+        blob_hash = blob_digest(blob) if blob else None
+        file_count = filepath.count("\n") + 1 if filepath else None
+        cursor.execute('''
+            INSERT INTO history (type, content_text, content_html, search_text, hash_val,
+                                 blob_hash, blob_size, width, height, item_size, file_count, file_meta)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(hash_val) DO NOTHING
+        ''', (type_, stored_text, stored_html, search_text, hash_val,
+              blob_hash, len(blob) if blob else None, width, height,
+              self.item_size(stored_text, stored_html, blob), file_count, file_meta))
+        if cursor.rowcount:
             row_id = cursor.lastrowid
             updated = False
-            
-        conn.commit()
-        if emit_signal:
-            global_signals.database_changed.emit('history')
+            if blob: self.store_blob(cursor, blob, thumb, codec)
+        elif file_meta:
+            # 同一组文件再次复制时顺带刷新大小与修改时间
+            cursor.execute("UPDATE history SET created_at = CURRENT_TIMESTAMP, file_meta = ? WHERE hash_val = ?",
+                           (file_meta, hash_val))
+            row_id = cursor.execute("SELECT id FROM history WHERE hash_val = ?", (hash_val,)).fetchone()['id']
+            updated = True
+        else:
+            cursor.execute("UPDATE history SET created_at = CURRENT_TIMESTAMP WHERE hash_val = ?", (hash_val,))
+            row_id = cursor.execute("SELECT id FROM history WHERE hash_val = ?", (hash_val,)).fetchone()['id']
+            updated = True
         return row_id, updated
 
-    def get_items(self, limit=50, search_query=None, only_pinned=False):
+    # ranked: 按 bm25 相关度排序；prefix: 只匹配以 query 开头的记录
+    # before: 分页游标 (created_at, id)，只返回排在该记录之后的条目
+    @perf.timed("get_items")
+    def get_items(self, limit=50, search_query=None, only_pinned=False, ranked=False, prefix=False, before=None):
         conn = self.get_conn()
-        sql = "SELECT * FROM history WHERE 1=1"
+        sql = f"SELECT {self.LIST_COLUMNS} FROM history"
         params = []
-        if only_pinned: sql += " AND is_pinned = 1"
-        if search_query:
-            sql += " AND search_text LIKE ?"
-            params.append(f"%{search_query}%")
-        sql += " ORDER BY created_at DESC LIMIT ?"
+        # 多个关键词须同时命中；trigram 至少需要 3 个字符，更短的关键词仍走 LIKE
+        terms = search_terms(search_query)
+        fts_terms = [t for t in terms if len(t) >= 3] if self.fts_enabled else []
+        use_fts = bool(fts_terms)
+        if use_fts:
+            sql += " JOIN history_fts ON history_fts.rowid = history.id WHERE history_fts MATCH ?"
+            params.append(" ".join(self.fts_phrase(t) for t in fts_terms))
+        else:
+            sql += " WHERE 1=1"
+        if only_pinned: sql += " AND history.is_pinned = 1"
+        for term in terms:
+            if term not in fts_terms:
+                sql += " AND history.search_text LIKE ? ESCAPE '\\'"
+                params.append(f"%{self.like_escape(term)}%")
+        if search_query and prefix:
+            # 前缀匹配在候选集上再过滤
+            sql += " AND history.search_text LIKE ? ESCAPE '\\'"
+            params.append(f"{self.like_escape(search_query)}%")
+        if use_fts and ranked:
+            sql += " ORDER BY history_fts.rank, history.created_at DESC LIMIT ?"
+        else:
+            if before:
+                sql += " AND (history.created_at, history.id) < (?, ?)"
+                params.extend(before)
+            sql += " ORDER BY history.created_at DESC, history.id DESC LIMIT ?"
         params.append(limit)
         return conn.execute(sql, params).fetchall()
 
-    def set_pinned(self, item_id, is_pinned):
-        self.get_conn().execute("UPDATE history SET is_pinned = ? WHERE id = ?", (1 if is_pinned else 0, item_id)).connection.commit()
-        global_signals.database_changed.emit('all')
-
-    def delete_item(self, item_id):
-        self.get_conn().execute("DELETE FROM history WHERE id = ?", (item_id,)).connection.commit()
-        global_signals.database_changed.emit('all')
+    @staticmethod
+    def item_size(text, html, blob):
+        # 按实际存储的字节计算，压缩过的正文只计压缩后的大小
+        size = len(blob) if blob else 0
+        for s in (text, html):
+            if isinstance(s, bytes): size += len(s)
+            elif s: size += len(s.encode("utf-8", "surrogatepass"))
+        return size
+
+    def prune(self, max_items, max_bytes=0, max_age_days=0, batch=100):
+        """按条数、总大小和保存天数删除一批未固定记录，返回被删除的 id"""
+        with self.write_batch() as conn:
+            return self.prune_batch(conn, max_items, max_bytes, max_age_days, batch)
+
+    @staticmethod
+    def prune_batch(conn, max_items, max_bytes, max_age_days, batch):
+        ids = []
+        if max_age_days:
+            ids = [r['id'] for r in conn.execute('''
+                SELECT id FROM history WHERE is_pinned = 0 AND created_at < datetime('now', ?)
+                ORDER BY created_at LIMIT ?
+            ''', (f"-{max_age_days} days", batch))]
+        if not ids:
+            count, total = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(item_size), 0) FROM history WHERE is_pinned = 0").fetchone()
+            excess = count - max_items
+            if excess > 0 or (max_bytes and total > max_bytes):
+                for r in conn.execute('''
+                    SELECT id, item_size FROM history WHERE is_pinned = 0
+                    ORDER BY created_at, id LIMIT ?
+                ''', (batch,)):
+                    if excess <= 0 and not (max_bytes and total > max_bytes): break
+                    ids.append(r['id'])
+                    excess -= 1
+                    total -= r['item_size'] or 0
+        if ids:
+            conn.executemany("DELETE FROM history WHERE id = ?", [(i,) for i in ids])
+        return ids
+
+    def incremental_vacuum(self, pages=256):
+        # 每次只回收少量空闲页，返回剩余的空闲页数
+        # execute() 只单步执行该 PRAGMA（每次仅回收一页），需用 executescript 执行到底
+        with self.write_lock:
+            conn = self.get_write_conn()
+            # 尚未转换为增量模式的旧数据库无法回收，空闲页由之后的 convert_auto_vacuum 一并处理
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2: return 0
+            conn.executescript(f"PRAGMA incremental_vacuum({pages});")
+            return conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+    def get_row(self, item_id):
+        # 单条轻量记录，用于列表增量更新
+        return self.get_conn().execute(
+            f"SELECT {self.LIST_COLUMNS} FROM history WHERE id = ?", (item_id,)).fetchone()
+
+    def get_item(self, item_id):
+        # 完整记录（含 html 与图片数据），仅在粘贴时调用，压缩的正文也只在这里解压
+        row = self.get_conn().execute(f'''
+            SELECT {self.LIST_COLUMNS}, history.content_text AS stored_text, history.content_html,
+                   history.file_meta, blobs.data AS content_blob
+            FROM history LEFT JOIN blobs ON blobs.hash = history.blob_hash
+            WHERE history.id = ?
+        ''', (item_id,)).fetchone()
+        if not row: return None
+        item = dict(row)
+        item['content_text'] = unpack_text(item.pop('stored_text'))
+        item['content_html'] = unpack_text(item['content_html'])
+        return item
+
+    def get_text(self, item_id):
+        # 完整正文（必要时解压），搜索摘要的命中不在预览前缀内时使用
+        row = self.get_conn().execute("SELECT content_text FROM history WHERE id = ?", (item_id,)).fetchone()
+        return unpack_text(row['content_text']) if row else None
+
+    def get_blob(self, blob_hash):
+        row = self.get_conn().execute("SELECT data FROM blobs WHERE hash = ?", (blob_hash,)).fetchone()
+        return row['data'] if row else None
+
+    def get_thumb(self, blob_hash, write_back=None):
+        conn = self.get_conn()
+        row = conn.execute("SELECT thumb, data FROM blobs WHERE hash = ?", (blob_hash,)).fetchone()
+        if not row: return None
+        if row['thumb']: return row['thumb']
+        # 缺少缩略图的旧数据：补生成一次并写回
+        img = decode_image(row['data'])
+        if img.isNull(): return None
+        thumb = make_thumbnail(img)
+        # 界面线程调用时传入 write_back，写回交给写线程
+        if write_back: write_back(blob_hash, thumb)
+        else: self.save_thumb(blob_hash, thumb)
+        return thumb
+
+    def save_thumb(self, blob_hash, thumb):
+        with self.write_batch() as conn:
+            conn.execute("UPDATE blobs SET thumb = ? WHERE hash = ?", (thumb, blob_hash))
+
+    def touch_item(self, item_id):
+        # 粘贴后置顶只需更新时间，不再重写正文与图片
+        with self.write_batch() as conn:
+            return conn.execute("UPDATE history SET created_at = CURRENT_TIMESTAMP WHERE id = ?",
+                                (item_id,)).rowcount > 0
+
+    def set_pinned(self, item_id, is_pinned, emit_signal=True):
+        with self.write_batch() as conn:
+            conn.execute("UPDATE history SET is_pinned = ? WHERE id = ?", (1 if is_pinned else 0, item_id))
+        if emit_signal: global_signals.history_delta.emit('pin' if is_pinned else 'unpin', item_id)
+
+    def delete_item(self, item_id, emit_signal=True):
+        with self.write_batch() as conn:
+            conn.execute("DELETE FROM history WHERE id = ?", (item_id,))
+        if emit_signal: global_signals.history_delta.emit('delete', item_id)
         
-    def clear_all(self, include_pinned=False):
+    def clear_all(self, include_pinned=False, emit_signal=True):
         sql = "DELETE FROM history" if include_pinned else "DELETE FROM history WHERE is_pinned = 0"
-        self.get_conn().execute(sql).connection.commit()
-        global_signals.database_changed.emit('all')
+        with self.write_batch() as conn:
+            conn.execute(sql)
+        if emit_signal: global_signals.database_changed.emit('all')
 
 class NativeHotkeyThread(QThread):
     sig_trigger = pyqtSignal()
@@ -239,7 +1104,7 @@ class NativeHotkeyThread(QThread):
                 while self.running:
                     res = user32.GetMessageW(ctypes.byref(msg), None, 0, 0)
                     if res == 0 or res == -1: break
-                    if msg.message == win32con.WM_HOTKEY: self.sig_trigger.emit()
+                    if msg.message == WM_HOTKEY: self.sig_trigger.emit()
                     user32.TranslateMessage(ctypes.byref(msg))
                     user32.DispatchMessageW(ctypes.byref(msg))
                 user32.UnregisterHotKey(None, 1)
@@ -250,136 +1115,967 @@ class NativeHotkeyThread(QThread):
         self.running = False
         if self.thread_id and sys.platform.startswith('win'):
             try:
-                ctypes.windll.user32.PostThreadMessageW(self.thread_id, win32con.WM_QUIT, 0, 0)
+                ctypes.windll.user32.PostThreadMessageW(self.thread_id, WM_QUIT, 0, 0)
             except: pass
         self.wait()
 
+class HotTier:
+    """最近条目的完整内容（已解码的图片）常驻内存，粘贴时直接生成 QMimeData，不再读库解码"""
+    MAX_ITEMS = 20
+    MAX_BYTES = 128 * 1024 * 1024
+
+    def __init__(self, max_items=MAX_ITEMS, max_bytes=MAX_BYTES):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.items = OrderedDict()  # id -> {'type', 'text', 'html', 'image'}
+        self.bytes = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def cost(payload):
+        img = payload.get('image')
+        return (img.sizeInBytes() if img else 0) + sum(
+            sys.getsizeof(payload[k]) for k in ('text', 'html') if payload.get(k))
+
+    @staticmethod
+    def from_item(item):
+        # get_item 返回的完整记录；文件类型的路径同样存放在 text 中
+        img = decode_image(item['content_blob']) if item['type'] == 'image' and item['content_blob'] else None
+        return {'type': item['type'], 'text': item['content_text'], 'html': item['content_html'], 'image': img}
+
+    def get(self, item_id):
+        with self.lock:
+            payload = self.items.get(item_id)
+            if payload is not None: self.items.move_to_end(item_id)
+            return payload
+
+    def put(self, item_id, payload):
+        cost = self.cost(payload)
+        if cost > self.max_bytes: return
+        with self.lock:
+            self.discard_locked(item_id)
+            self.items[item_id] = payload
+            self.bytes += cost
+            while len(self.items) > self.max_items or self.bytes > self.max_bytes:
+                self.discard_locked(next(iter(self.items)))
+
+    def discard(self, item_id):
+        with self.lock: self.discard_locked(item_id)
+
+    def discard_locked(self, item_id):
+        payload = self.items.pop(item_id, None)
+        if payload is not None: self.bytes -= self.cost(payload)
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+            self.bytes = 0
+
+    @staticmethod
+    def mime(payload, as_plain_text=False):
+        # QMimeData 交给剪贴板后归其所有，每次粘贴都新建，但只是引用内存中的数据
+        mime = QMimeData()
+        kind = payload['type']
+        if as_plain_text or kind == 'text':
+            mime.setText(payload['text'])
+        elif kind == 'html':
+            mime.setHtml(payload['html'])
+            mime.setText(payload['text'])
+        elif kind == 'image':
+            if payload['image'] is not None: mime.setImageData(payload['image'])
+        elif kind == 'file':
+            # 多个文件一次性放入剪贴板
+            mime.setUrls([QUrl.fromLocalFile(p) for p in payload['text'].split("\n")])
+        return mime
+
+class DBWriterThread(QThread):
+    """后台写线程：合并一批写入后统一提交，再通过信号通知界面"""
+    BATCH_SIZE = 32
+    MAX_PENDING = 64
+    PRUNE_BATCH = 100
+    PRUNE_IDLE_SECONDS = 0.05
+    VACUUM_IDLE_SECONDS = 5
+    WAKE = 'wake'
+
+    def __init__(self, db, hot_tier=None):
+        super().__init__()
+        self.db = db
+        self.hot_tier = hot_tier
+        self.queue = queue.Queue(maxsize=self.MAX_PENDING)
+        # 界面线程提交的写操作，不受队列容量限制，写线程取下一批时一并执行
+        self.ops = deque()
+        self.policy = None
+        self.prune_pending = False
+        self.vacuum_pending = True
+
+    def set_policy(self, max_items, max_bytes=0, max_age_days=0):
+        # 保留策略变更或定时检查：写线程空闲时分批清理
+        self.policy = {'max_items': max_items, 'max_bytes': max_bytes, 'max_age_days': max_age_days}
+        self.prune_pending = True
+        try: self.queue.put_nowait(self.WAKE)
+        except queue.Full: pass
+
+    def submit(self, job):
+        # 队列满时阻塞调用方（编码线程），形成背压
+        self.queue.put(job)
+
+    def post(self, op):
+        # 界面线程的写操作从不获取写锁（写线程可能正在执行耗时的 VACUUM）；
+        # 队列已满时写线程很快会取下一批，不必再唤醒
+        self.ops.append(op)
+        try: self.queue.put_nowait(self.WAKE)
+        except queue.Full: pass
+
+    # 操作以 {'op': 名称, 'args': 参数} 表示，与采集线程提交的新条目（add_item 的参数）区分
+    def touch(self, item_id):
+        # 粘贴后置顶
+        self.post({'op': 'touch', 'args': (item_id,)})
+
+    def set_pinned(self, item_id, is_pinned):
+        self.post({'op': 'pin', 'args': (item_id, is_pinned)})
+
+    def delete_item(self, item_id):
+        self.post({'op': 'delete', 'args': (item_id,)})
+
+    def clear_all(self, include_pinned=False):
+        self.post({'op': 'clear', 'args': (include_pinned,)})
+
+    def save_thumb(self, blob_hash, thumb):
+        self.post({'op': 'save_thumb', 'args': (blob_hash, thumb)})
+
+    def run(self):
+        db = self.db
+        if not db.ready.is_set():
+            # 启动时的建表、迁移检查在写线程完成，不阻塞托盘与界面
+            try:
+                db.init_db()
+            except Exception as e:
+                # 不置 ready：读取方都以 ready 为准，不会查询缺失的表
+                print(f"DB Init Error: {e}")
+                db.init_error = e
+                global_signals.database_failed.emit(str(e))
+            else:
+                global_signals.database_ready.emit()
+        while True:
+            # 数据库初始化失败后不再清理或写入，只取走队列中的任务，采集线程不会因队列满而阻塞
+            if db.init_error is not None: timeout = None
+            elif self.prune_pending: timeout = self.PRUNE_IDLE_SECONDS
+            elif self.vacuum_pending: timeout = self.VACUUM_IDLE_SECONDS
+            else: timeout = None
+            try:
+                job = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                if self.prune_pending: self.prune_step(db)
+                else: self.vacuum_step(db)
+                continue
+            if job is None: break
+            batch = [] if job == self.WAKE else [job]
+            while len(batch) < self.BATCH_SIZE:
+                try:
+                    job = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if job is None:
+                    self.queue.put(None)
+                    break
+                if job != self.WAKE: batch.append(job)
+            while self.ops:
+                batch.append(self.ops.popleft())
+            if batch and db.init_error is None: self.write(db, batch)
+        # 退出前执行界面线程最后提交的操作
+        if self.ops and db.init_error is None: self.write(db, list(self.ops))
+
+    def write(self, db, batch):
+        # 组提交：整批写入只提交一次，提交后再通知界面
+        deltas, hot, cleared = [], [], False
+        with db.write_batch():
+            for job in batch:
+                op = job.get('op')
+                try:
+                    if op == 'touch':
+                        if db.touch_item(*job['args']): deltas.append(('bump', job['args'][0]))
+                    elif op == 'pin':
+                        item_id, is_pinned = job['args']
+                        db.set_pinned(item_id, is_pinned, emit_signal=False)
+                        deltas.append(('pin' if is_pinned else 'unpin', item_id))
+                    elif op == 'delete':
+                        db.delete_item(*job['args'], emit_signal=False)
+                        deltas.append(('delete', job['args'][0]))
+                    elif op == 'clear':
+                        db.clear_all(*job['args'], emit_signal=False)
+                        cleared = True
+                    elif op == 'save_thumb':
+                        db.save_thumb(*job['args'])
+                    else:
+                        payload = job.pop('hot', None)
+                        row_id, updated = db.add_item(**job, emit_signal=False)
+                        deltas.append(('bump' if updated else 'insert', row_id))
+                        if payload and self.hot_tier: hot.append((row_id, payload))
+                except Exception as e:
+                    print(f"DB Write Error: {e}")
+        for row_id, payload in hot:
+            self.hot_tier.put(row_id, payload)
+        for op, row_id in deltas:
+            global_signals.history_delta.emit(op, row_id)
+        if cleared: global_signals.database_changed.emit('all')
+        if self.policy and any(op == 'insert' for op, _ in deltas):
+            self.prune_pending = True
+
+    def prune_step(self, db):
+        # 每次只删除一小批并立即提交，新的写入不会被长时间阻塞
+        free_pages = 0
+        try:
+            ids = db.prune(**self.policy, batch=self.PRUNE_BATCH)
+            free_pages = db.incremental_vacuum()
+        except Exception as e:
+            print(f"Prune Error: {e}")
+            ids = []
+        for row_id in ids:
+            global_signals.history_delta.emit('delete', row_id)
+        if len(ids) < self.PRUNE_BATCH and not free_pages:
+            self.prune_pending = False
+
+    def vacuum_step(self, db):
+        # 首轮清理完成且一段时间没有写入后，把旧数据库转换为增量 vacuum 模式
+        self.vacuum_pending = False
+        try:
+            with perf.span("convert_auto_vacuum"):
+                db.convert_auto_vacuum()
+        except Exception as e:
+            print(f"Vacuum Error: {e}")
+
+    def stop(self):
+        self.queue.put(None)
+        self.wait()
+
+class CapturePolicy:
+    """按类型限制采集大小：超长文本截断，超出像素上限的图片缩小或只保留预览图；0 为不限"""
+    def __init__(self, max_text_bytes=0, max_image_pixels=0, image_preview_only=False, image_codec='auto'):
+        self.max_text_bytes = max_text_bytes
+        self.max_image_pixels = max_image_pixels
+        self.image_preview_only = image_preview_only
+        self.image_codec = image_codec
+
+    def clip_text(self, text):
+        # 上限按 UTF-8 编码后的字节数计算，截断处落在多字节字符中间时舍去该字符
+        if not text or self.text_fits(text): return text
+        raw = text[:self.max_text_bytes].encode("utf-8", "surrogatepass")[:self.max_text_bytes]
+        return codecs.getincrementaldecoder("utf-8")("surrogatepass").decode(raw)
+
+    def text_fits(self, text):
+        limit = self.max_text_bytes
+        # 每个字符编码后占 1~4 字节，多数情况下只看字符数就能判断，不必真正编码
+        if not limit or len(text) * 4 <= limit: return True
+        if len(text) > limit: return False
+        return len(text.encode("utf-8", "surrogatepass")) <= limit
+
+    def fit_image(self, img):
+        pixels = img.width() * img.height()
+        if not self.max_image_pixels or pixels <= self.max_image_pixels: return img
+        if self.image_preview_only:
+            size = QSize(THUMB_MAX_WIDTH, THUMB_MAX_HEIGHT)
+        else:
+            scale = math.sqrt(self.max_image_pixels / pixels)
+            size = QSize(max(1, int(img.width() * scale)), max(1, int(img.height() * scale)))
+        return img.scaled(size, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
+
+class CaptureWorker(QThread):
+    """后台采集线程：图片编码、哈希与缩略图都不占用界面线程"""
+    MAX_PENDING_BYTES = 256 * 1024 * 1024
+    DROP_MIN_BYTES = 1024 * 1024    # 积压超限时只丢弃不小于此大小的快照，普通文本不会丢
+    COALESCE_SECONDS = 0.05
+
+    def __init__(self, writer, recompressor=None):
+        super().__init__()
+        self.writer = writer
+        self.recompressor = recompressor
+        # 队列不限条数，只按积压的字节数限制
+        self.queue = queue.Queue()
+        self.policy = CapturePolicy()
+        self.pending_bytes = 0
+        self.lock = threading.Lock()
+
+    def set_policy(self, policy):
+        self.policy = policy
+        if self.recompressor: self.recompressor.schedule(policy.image_codec)
+
+    @staticmethod
+    def snapshot_cost(snapshot):
+        cost = sum(sys.getsizeof(snapshot[k]) for k in ('text', 'html') if snapshot.get(k))
+        cost += sum(sys.getsizeof(p) for p in snapshot.get('paths', ()))
+        img = snapshot.get('image')
+        return cost + (img.sizeInBytes() if img else 0)
+
+    def submit(self, snapshot):
+        # 界面线程从不阻塞：积压的数据过大时丢弃最旧的大快照（通常是图片），限制峰值内存
+        snapshot['ts'] = time.monotonic()
+        snapshot['cost'] = self.snapshot_cost(snapshot)
+        with self.lock: self.pending_bytes += snapshot['cost']
+        self.queue.put_nowait(snapshot)
+        while self.pending_bytes > self.MAX_PENDING_BYTES and self.drop_oldest_large(snapshot):
+            pass
+
+    def drop_oldest_large(self, keep):
+        # 刚提交的快照总是保留；没有可丢弃的快照时返回 False
+        with self.queue.mutex:
+            dropped = next((s for s in self.queue.queue
+                            if s is not None and s is not keep and s['cost'] >= self.DROP_MIN_BYTES), None)
+            if dropped is None: return False
+            self.queue.queue.remove(dropped)
+        self.taken(dropped)
+        perf.count("capture_dropped")
+        print(f"Capture Dropped: {dropped['type']} snapshot of {dropped['cost'] // 1024} KB, "
+              f"backlog {self.pending_bytes // (1024 * 1024)} MB")
+        return True
+
+    def taken(self, snapshot):
+        if snapshot is not None:
+            with self.lock: self.pending_bytes -= snapshot['cost']
+        return snapshot
+
+    def run(self):
+        carry = None
+        while True:
+            if carry is not None:
+                snapshot, carry = carry, None
+            else:
+                snapshot = self.taken(self.queue.get())
+                if snapshot is None: break
+            # 同一次复制常触发多次 dataChanged，与前一个快照间隔很短的后续快照覆盖前一个；
+            # 间隔按两个快照的提交时间计算，线程处理积压时不同的复制仍逐个保存
+            while True:
+                wait = snapshot['ts'] + self.COALESCE_SECONDS - time.monotonic()
+                try:
+                    newer = self.queue.get(timeout=max(0, wait)) if wait > 0 else self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if newer is None:
+                    self.queue.put(None)
+                    break
+                newer = self.taken(newer)
+                if newer['ts'] - snapshot['ts'] >= self.COALESCE_SECONDS:
+                    carry = newer
+                    break
+                snapshot = newer
+            try:
+                job = self.encode(snapshot, self.policy)
+            except Exception as e:
+                print(f"Capture Error: {e}")
+                continue
+            if job:
+                # 解码后的内容随写入一起进入热缓存，粘贴刚复制的条目不必读库
+                job['hot'] = {'type': snapshot['type'], 'text': job['text'] or job['filepath'],
+                              'html': job['html'], 'image': snapshot.get('image')}
+                self.writer.submit(job)
+                # 新条目会把更早的 raw 图片挤出最近条目
+                if self.recompressor: self.recompressor.schedule()
+
+    @staticmethod
+    @perf.timed("capture_encode")
+    def encode(snapshot, policy=None):
+        job = {'type_': snapshot['type'], 'text': snapshot.get('text'), 'html': snapshot.get('html'),
+               'filepath': "\n".join(snapshot['paths']) if snapshot.get('paths') else None}
+        img = snapshot.get('image')
+        if snapshot['type'] == 'image':
+            if not img or img.isNull(): return None
+            # 按原图去重，缩小只影响保存的内容
+            job['hash_val'] = image_hash(img)
+            # 缩小后的图片写回快照，热缓存保存的与数据库一致
+            if policy: img = snapshot['image'] = policy.fit_image(img)
+            blob, codec = encode_image(img, choose_image_codec(img, policy.image_codec if policy else 'auto'))
+            job.update(blob=blob, codec=codec, width=img.width(), height=img.height(),
+                       thumb=make_thumbnail(img))
+        elif snapshot['type'] == 'file':
+            job['hash_val'] = content_hash('file', job['filepath'])
+            # 大小与修改时间在采集线程里一次取完，网络路径较慢也不影响界面
+            job['file_meta'] = file_metadata(snapshot['paths'])
+        else:
+            job['hash_val'] = content_hash(snapshot['type'], snapshot['text'])
+        return job
+
+    def stop(self):
+        self.queue.put(None)
+        self.wait()
+
+class ImageRecompressThread(QThread):
+    """低优先级后台线程：把移出最近条目的原始像素图片转成紧凑格式
+    无损 WebP 编码一张大图需要数秒，放在采集线程会推迟新复制内容的保存"""
+    RECENT_RAW_ITEMS = 20       # auto 编码下保持原始像素的最近条目数
+    IDLE_SECONDS = 2.0
+
+    def __init__(self, db):
+        super().__init__()
+        self.db = db
+        self.codec = 'auto'
+        self.wake = threading.Event()
+        self.running = True
+
+    def schedule(self, codec=None):
+        # 有新条目或编码设置变更：空闲一段时间后再检查
+        if codec is not None: self.codec = codec
+        self.wake.set()
+
+    def run(self):
+        pending = True
+        while self.running:
+            # 复制频繁时每次唤醒都重新计时，只在空闲时转换
+            woken = self.wake.wait(self.IDLE_SECONDS if pending else None)
+            self.wake.clear()
+            if woken:
+                pending = True
+                continue
+            pending = self.recompress_step()
+
+    def recompress_step(self):
+        """转换一张图片，返回是否可能还有待处理的"""
+        if self.codec != 'auto': return False
+        db = self.db
+        if not db.ready.is_set(): return db.init_error is None
+        try:
+            blob_hash = db.next_raw_blob(self.RECENT_RAW_ITEMS)
+            if not blob_hash: return False
+            img = decode_image(db.get_blob(blob_hash))
+            with perf.span("image_recompress"):
+                data, codec = encode_image(img, compact_image_codec(img))
+            db.replace_blob(blob_hash, data, codec)
+        except Exception as e:
+            print(f"Recompress Error: {e}")
+            return False
+        return True
+
+    def stop(self):
+        self.running = False
+        self.wake.set()
+        self.wait()
+
+class FileIconThread(QThread):
+    """文件图标后台查询：系统图标查找会访问磁盘（网络路径、已删除的文件可能很慢），不占用界面线程"""
+    ICON_SIZE = 28
+    PER_FILE_EXTS = {'.exe', '.lnk', '.url', '.ico'}   # 图标因文件而异
+    sig_loaded = pyqtSignal(str, QImage)
+
+    def __init__(self):
+        super().__init__()
+        self.queue = queue.Queue()
+        self.pending = set()
+        self.placeholder = None
+        self.sig_loaded.connect(self.on_loaded)
+
+    @classmethod
+    def icon_key(cls, path):
+        ext = os.path.splitext(path)[1].lower()
+        # 没有扩展名的可能是文件夹，与自带图标的文件一样按路径查询
+        return ext if ext and ext not in cls.PER_FILE_EXTS else path
+
+    def icon(self, path):
+        """返回缓存的图标；尚未就绪时提交后台查询并先返回占位图标，查询完成后发出 sig_loaded"""
+        key = self.icon_key(path)
+        pix = file_icon_cache.get(key)
+        if pix is not None: return pix
+        if key not in self.pending:
+            self.pending.add(key)
+            self.queue.put((key, path))
+        return self.placeholder_icon()
+
+    def placeholder_icon(self):
+        # 通用文件图标不需要访问磁盘
+        if self.placeholder is None:
+            self.placeholder = QFileIconProvider().icon(QFileIconProvider.IconType.File).pixmap(
+                self.ICON_SIZE, self.ICON_SIZE)
+        return self.placeholder
+
+    def run(self):
+        # 系统图标查询依赖 COM
+        if sys.platform.startswith('win'):
+            ctypes.windll.ole32.CoInitialize(None)
+        provider = QFileIconProvider()
+        while True:
+            job = self.queue.get()
+            if job is None: break
+            key, path = job
+            try:
+                img = provider.icon(QFileInfo(path)).pixmap(self.ICON_SIZE, self.ICON_SIZE).toImage()
+            except Exception as e:
+                print(f"Icon Error: {e}")
+                img = QImage()
+            self.sig_loaded.emit(key, img)
+
+    def on_loaded(self, key, img):
+        # 在界面线程执行：转换为 QPixmap 并放入共享缓存，视图随后重绘
+        self.pending.discard(key)
+        file_icon_cache.put(key, QPixmap.fromImage(img) if not img.isNull() else self.placeholder_icon())
+
+    def stop(self):
+        self.queue.put(None)
+        self.wait()
+
+class InstanceChannel(QObject):
+    """单实例的命令服务端：再次启动的进程经 send_instance_command 转发命令，基准测试也通过它驱动界面
+    协议为每行一条 UTF-8 命令（show / search <文本> / hide / ping / quit），逐条应答 ok 或 error"""
+    COMMANDS = INSTANCE_COMMANDS
+    sig_command = pyqtSignal(str, str)
+
+    def __init__(self, name, parent=None):
+        super().__init__(parent)
+        self.name = name
+        self.server = QLocalServer(self)
+        self.server.newConnection.connect(self.on_new_connection)
+        # 持有连接的 Python 包装对象：否则可能被回收，连带 readyRead 上的 lambda 一起失效，命令得不到应答
+        self.clients = set()
+
+    def listen(self):
+        if self.server.listen(self.name): return True
+        # 上次异常退出遗留的套接字：确认无人应答后清除再监听
+        if send_instance_command(self.name, "ping", 200) is None:
+            QLocalServer.removeServer(self.name)
+            return self.server.listen(self.name)
+        return False
+
+    def on_new_connection(self):
+        while self.server.hasPendingConnections():
+            sock = self.server.nextPendingConnection()
+            self.clients.add(sock)
+            sock.readyRead.connect(lambda sock=sock: self.on_ready_read(sock))
+            sock.disconnected.connect(lambda sock=sock: self.on_disconnected(sock))
+            # 连接建立前已到达的数据不会再触发 readyRead
+            self.on_ready_read(sock)
+
+    def on_disconnected(self, sock):
+        self.clients.discard(sock)
+        sock.deleteLater()
+
+    def on_ready_read(self, sock):
+        while sock.canReadLine():
+            line = bytes(sock.readLine()).decode("utf-8", "replace").rstrip("\r\n")
+            command, _, arg = line.partition(" ")
+            if command in self.COMMANDS:
+                # 先应答再执行，quit 也能收到回复
+                sock.write(b"ok\n")
+                sock.flush()
+                self.sig_command.emit(command, arg)
+            else:
+                sock.write(b"error\n")
+                sock.flush()
+
 # ==========================================
-# 3. 自定义列表项
+# 3. 列表模型与绘制委托
 # ==========================================
-class ClipboardItemWidget(QWidget):
-    MAX_HEIGHT = 120
+class HistoryModel(QAbstractListModel):
+    RowRole = Qt.ItemDataRole.UserRole + 1
+    PAGE_SIZE = 50
+    CANDIDATE_LIMIT = 200   # 搜索时一次取回的候选数；不足此数说明结果已完整，可在内存中继续细化
+    CACHE_SIZE = 16         # 最近查询的结果缓存，退格时直接复用
 
-    def __init__(self, data_row, search_keyword="", parent=None):
+    def __init__(self, db, only_pinned=False, parent=None):
         super().__init__(parent)
-        self.data = data_row
-        self.search_keyword = search_keyword
-        self.init_ui()
-
-    def init_ui(self):
-        layout = QVBoxLayout(self)
-        layout.setContentsMargins(4, 4, 4, 4) 
-        layout.setSpacing(0)
-
-        self.container = QFrame()
-        self.container.setObjectName("ItemContainer")
-        self.container.setMaximumHeight(self.MAX_HEIGHT)
-        
-        type_color = self.get_color_by_type()
-        self.container.setStyleSheet(f"""
-            #ItemContainer:hover {{
-                border: 1px solid {type_color};
-            }}
-        """)
-
-        self.con_layout = QHBoxLayout(self.container)
-        self.con_layout.setContentsMargins(0, 0, 0, 0)
-        self.con_layout.setSpacing(0)
-
-        self.color_strip = QLabel()
-        self.color_strip.setFixedWidth(4)
-        self.color_strip.setStyleSheet(f"background-color: {self.get_color_by_type()};")
-        self.color_strip.setSizePolicy(QSizePolicy.Policy.Fixed, QSizePolicy.Policy.Expanding)
-        self.con_layout.addWidget(self.color_strip)
-
-        self.content_lbl = QLabel()
-        self.content_lbl.setAlignment(Qt.AlignmentFlag.AlignTop | Qt.AlignmentFlag.AlignLeft)
-        self.content_lbl.setStyleSheet("border: none; background: transparent; padding: 4px 4px;") 
-        self.con_layout.addWidget(self.content_lbl, 1)
-        
-        self.render_content()
-        layout.addWidget(self.container)
-
-    def get_color_by_type(self):
-        t = self.data['type']
-        if t == 'text': return "#34A853"
-        if t == 'html': return "#4285F4"
-        if t == 'image': return "#EA4335"
-        if t == 'file': return "#FBBC05"
-        return "#9AA0A6"
-
-    def render_content(self):
-        t = self.data['type']
-        blob = self.data['content_blob']
-        if blob:
-            img = QImage.fromData(blob)
-            if not img.isNull():
-                pix = QPixmap.fromImage(img)
-                target_h = self.MAX_HEIGHT - 10 
-                if pix.height() > target_h:
-                    pix = pix.scaledToHeight(target_h, Qt.TransformationMode.SmoothTransformation)
-                if pix.width() > 320: 
-                    pix = pix.scaledToWidth(320, Qt.TransformationMode.SmoothTransformation)
-                
-                self.content_lbl.setPixmap(pix)
-                self.content_lbl.setAlignment(Qt.AlignmentFlag.AlignLeft)
-                return
-
-        if t == 'file':
-            path = self.data['content_text']
-            file_info = QFileInfo(path)
-            icon_provider = QFileIconProvider()
-            icon = icon_provider.icon(file_info)
-            pix = icon.pixmap(28, 28)
-            filename = os.path.basename(path)
-            if self.search_keyword: filename = self.highlight_text(filename)
-            
-            icon_lbl = QLabel()
-            icon_lbl.setPixmap(pix)
-            icon_lbl.setFixedSize(32, 32)
-            icon_lbl.setStyleSheet("background: transparent; border: none; padding-left: 4px;")
-            icon_lbl.setAlignment(Qt.AlignmentFlag.AlignVCenter | Qt.AlignmentFlag.AlignVCenter)
-            self.con_layout.insertWidget(1, icon_lbl)
-            
-            self.content_lbl.setText(filename)
-            self.content_lbl.setTextFormat(Qt.TextFormat.RichText)
-            self.content_lbl.setWordWrap(True)
-            self.content_lbl.setAlignment(Qt.AlignmentFlag.AlignVCenter | Qt.AlignmentFlag.AlignLeft)
+        self.db = db
+        self.only_pinned = only_pinned
+        self.rows = []
+        self.query = ""
+        self.matcher = SearchMatcher()
+        self.has_more = False
+        self.entry = None
+        self.cache = OrderedDict()  # query -> {'matcher', 'rows', 'complete'}
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid(): return None
+        row = self.rows[index.row()]
+        if role == self.RowRole: return row
+        if role == Qt.ItemDataRole.DisplayRole: return preview_text(row)
+        return None
+
+    @perf.timed("populate_list")
+    def load(self, query=""):
+        # 只加载第一页，其余由视图滚动到底部时通过 fetchMore 按需加载；
+        # 数据库尚未初始化完成时跳过，database_ready 到达后会重新加载
+        if not self.db.ready.is_set(): return
+        matcher = SearchMatcher(query)
+        entry = self.cached_results(query, matcher) if matcher and not self.only_pinned else None
+        if entry is None and matcher and not self.only_pinned:
+            items = self.db.get_items(limit=self.CANDIDATE_LIMIT, search_query=query)
+            entry = self.remember(query, matcher, [dict(r) for r in items], len(items) < self.CANDIDATE_LIMIT)
+        if entry is None:
+            items = self.db.get_items(limit=self.PAGE_SIZE, search_query=query, only_pinned=self.only_pinned)
+        self.beginResetModel()
+        if entry is None:
+            self.rows = [dict(r) for r in items]
+            self.has_more = len(items) == self.PAGE_SIZE
+        else:
+            self.rows = entry['rows'][:self.PAGE_SIZE]
+            self.has_more = len(entry['rows']) > self.PAGE_SIZE or not entry['complete']
+        self.query = query
+        self.matcher = matcher
+        self.entry = entry
+        self.endResetModel()
+
+    def cached_results(self, query, matcher):
+        entry = self.cache.get(query)
+        if entry is not None:
+            self.cache.move_to_end(query)
+            return entry
+        # 在查询追加字符时，从最近的完整候选集中过滤，不再访问数据库
+        for old in reversed(self.cache.values()):
+            if old['complete'] and old['matcher'].covers(matcher):
+                rows = [r for r in old['rows'] if matcher.matches(r['search_text'])]
+                return self.remember(query, matcher, rows, True)
+        return None
+
+    def remember(self, query, matcher, rows, complete):
+        entry = self.cache[query] = {'matcher': matcher, 'rows': rows, 'complete': complete}
+        if len(self.cache) > self.CACHE_SIZE: self.cache.popitem(last=False)
+        return entry
+
+    def clear_cache(self):
+        self.cache.clear()
+        self.entry = None
+
+    def update_cache(self, op, item_id, row=None):
+        """按单条变化修正缓存的搜索结果，其余查询的缓存不受影响"""
+        for entry in self.cache.values():
+            rows = entry['rows']
+            pos = next((i for i, r in enumerate(rows) if r['id'] == item_id), -1)
+            if op in ('pin', 'unpin'):
+                if pos >= 0: rows[pos]['is_pinned'] = 1 if op == 'pin' else 0
+                continue
+            if pos >= 0: del rows[pos]
+            # 新增/置顶的记录时间最新，排在最前
+            if op != 'delete' and entry['matcher'].matches(row['search_text']):
+                rows.insert(0, row)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self.has_more
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or not self.has_more or not self.rows: return
+        # 增量更新插到顶部的记录可能已在列表中
+        known = {r['id'] for r in self.rows}
+        cached = [r for r in self.entry['rows'] if r['id'] not in known] if self.entry else []
+        if cached:
+            items = cached[:self.PAGE_SIZE]
+            self.has_more = len(cached) > self.PAGE_SIZE or not self.entry['complete']
+        else:
+            last = self.rows[-1]
+            items = self.db.get_items(limit=self.PAGE_SIZE, search_query=self.query, only_pinned=self.only_pinned,
+                                      before=(last['created_at'], last['id']))
+            self.has_more = len(items) == self.PAGE_SIZE
+            items = [dict(r) for r in items if r['id'] not in known]
+        if not items: return
+        self.beginInsertRows(QModelIndex(), len(self.rows), len(self.rows) + len(items) - 1)
+        self.rows.extend(items)
+        self.endInsertRows()
+
+    def find_row(self, item_id):
+        for i, row in enumerate(self.rows):
+            if row['id'] == item_id: return i
+        return -1
+
+    def accepts(self, row):
+        if self.only_pinned and not row['is_pinned']: return False
+        if self.matcher and not self.matcher.matches(row['search_text']): return False
+        return True
+
+    def apply_delta(self, op, item_id):
+        """按单条变化增删/移动一行，保留其余行与选中状态"""
+        if not self.db.ready.is_set(): return
+        pos = self.find_row(item_id)
+        if self.cache and op in ('delete', 'pin', 'unpin'): self.update_cache(op, item_id)
+        if op == 'delete' or (op == 'unpin' and self.only_pinned):
+            if pos >= 0:
+                self.beginRemoveRows(QModelIndex(), pos, pos)
+                del self.rows[pos]
+                self.endRemoveRows()
             return
 
-        text = self.data['content_text'] or ""
-        display_text = text[:800] 
-        if self.search_keyword:
-            display_text = self.highlight_text(display_text).replace("\n", "<br>")
-            self.content_lbl.setTextFormat(Qt.TextFormat.RichText)
+        if op in ('pin', 'unpin') and pos >= 0:
+            self.rows[pos]['is_pinned'] = 1 if op == 'pin' else 0
+            idx = self.index(pos)
+            self.dataChanged.emit(idx, idx)
+            return
+        if op == 'unpin': return
+
+        row = self.db.get_row(item_id)
+        if not row: return
+        row = dict(row)
+        if self.cache and op in ('insert', 'bump'): self.update_cache(op, item_id, row)
+        if pos >= 0:
+            self.rows[pos].update(row)
+            if op == 'bump' and pos > 0:
+                self.beginMoveRows(QModelIndex(), pos, pos, QModelIndex(), 0)
+                self.rows.insert(0, self.rows.pop(pos))
+                self.endMoveRows()
+            return
+        if not self.accepts(row): return
+
+        # 新固定的记录按时间插入，新增/置顶的记录插到最前
+        target = 0
+        if op == 'pin':
+            while target < len(self.rows) and self.rows[target]['created_at'] > row['created_at']:
+                target += 1
+            # 落在尚未加载的页中，留给 fetchMore 按顺序取回
+            if target == len(self.rows) and self.has_more: return
+        self.beginInsertRows(QModelIndex(), target, target)
+        self.rows.insert(target, row)
+        self.endInsertRows()
+
+class ClipItemDelegate(QStyledItemDelegate):
+    MAX_HEIGHT = 120
+    MARGIN = 4          # 行外边距
+    PADDING = 5         # 边框 1px + 内边距 4px
+    STRIP_WIDTH = 4
+    ICON_BOX = 32
+    MAX_TEXT_CHARS = 800
+    WIDTH_BUCKET = 16       # 行高按宽度分档缓存，档内拖动窗口不需要重新测量
+    HEIGHT_CACHE_LIMIT = 20000
+    SNIPPET_CACHE_LIMIT = 512
+    REMEASURE_CHUNK = 100
+
+    # 颜色预先构造为 QColor，绘制时直接取用；切换主题只替换这张表
+    THEMES = {
+        True: {k: QColor(v) for k, v in
+               {'bg': '#ffffff', 'hover_bg': '#ffffff', 'border': '#cccccc', 'text': '#333333'}.items()},
+        False: {k: QColor(v) for k, v in
+                {'bg': '#2b2b2b', 'hover_bg': '#333333', 'border': '#444444', 'text': '#e0e0e0'}.items()},
+    }
+    TYPE_COLORS = {t: QColor(c) for t, c in
+                   {'text': "#34A853", 'html': "#4285F4", 'image': "#EA4335", 'file': "#FBBC05"}.items()}
+    DEFAULT_TYPE_COLOR = QColor("#9AA0A6")
+
+    def __init__(self, db, writer, icons, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self.writer = writer    # DBWriterThread，补生成的缩略图经它写回
+        self.icons = icons      # FileIconThread，各列表共用
+        self.colors = self.THEMES[True]
+        self.heights = {}       # (item id, query) -> {width bucket: height}
+        self.pending = OrderedDict()    # (item id, query) -> (index, font, bucket)，尚未按当前宽度测量的行
+        self.snippets = OrderedDict()   # (item id, query) -> 围绕第一个命中截取的显示文本
+        self.metrics = {}       # font key -> (QFontMetricsF, 行高, 最窄字符宽度)
+        self.remeasure_timer = QTimer(self)
+        self.remeasure_timer.setSingleShot(True)
+        self.remeasure_timer.timeout.connect(self.remeasure_pending)
+
+    def set_light(self, is_light):
+        self.colors = self.THEMES[is_light]
+
+    @classmethod
+    def get_color_by_type(cls, t):
+        return cls.TYPE_COLORS.get(t, cls.DEFAULT_TYPE_COLOR)
+
+    @staticmethod
+    def view_width(option):
+        return option.widget.viewport().width() if option.widget else 300
+
+    def content_rect(self, rect):
+        m, p = self.MARGIN, self.PADDING
+        return rect.adjusted(m + self.STRIP_WIDTH + p, m + p, -m - p, -m - p)
+
+    def sizeHint(self, option, index):
+        row = index.data(HistoryModel.RowRole)
+        matcher = index.model().matcher
+        width = self.view_width(option)
+        bucket = width // self.WIDTH_BUCKET
+        # 搜索时显示的是命中处的摘要，行高随查询不同
+        key = (row['id'], matcher.query)
+        known = self.heights.get(key)
+        if known:
+            height = known.get(bucket)
+            if height is not None: return QSize(width, height)
+            # 宽度换档时先沿用最接近档位的高度，可见行在绘制时、其余行在空闲时再精确测量
+            self.pending[key] = (QPersistentModelIndex(index), QFont(option.font), bucket)
+            self.remeasure_timer.start()
+            return QSize(width, known[min(known, key=lambda b: abs(b - bucket))])
+        return QSize(width, self.measure_height(row, matcher, option.font, bucket))
+
+    def measure_height(self, row, matcher, font, bucket):
+        # 按档位下限宽度测量，实际宽度只会更宽，行不会被截断
+        content = self.content_rect(QRect(0, 0, bucket * self.WIDTH_BUCKET, self.MAX_HEIGHT))
+        height = min(self.measure(row, matcher, font, content.width()) + 2 * (self.MARGIN + self.PADDING),
+                     self.MAX_HEIGHT)
+        if len(self.heights) >= self.HEIGHT_CACHE_LIMIT: self.heights.clear()
+        key = (row['id'], matcher.query)
+        self.heights.setdefault(key, {})[bucket] = height
+        self.pending.pop(key, None)
+        return height
+
+    def remeasure(self, key):
+        index, font, bucket = self.pending.pop(key)
+        if not index.isValid(): return
+        row = index.data(HistoryModel.RowRole)
+        matcher = index.model().matcher
+        if (row['id'], matcher.query) != key or bucket in self.heights.get(key, {}): return
+        old = self.heights.get(key)
+        estimate = old[min(old, key=lambda b: abs(b - bucket))] if old else None
+        if self.measure_height(row, matcher, font, bucket) != estimate:
+            self.sizeHintChanged.emit(QModelIndex(index))
+
+    def remeasure_pending(self):
+        for _ in range(min(self.REMEASURE_CHUNK, len(self.pending))):
+            self.remeasure(next(iter(self.pending)))
+        if self.pending: self.remeasure_timer.start()
+
+    def measure(self, row, matcher, font, width):
+        if row.get('blob_hash'):
+            return self.thumb_size(row).height()
+        if row['type'] == 'file':
+            return max(self.ICON_BOX, self.text_height(file_label(row)[0], font, width - self.ICON_BOX))
+        return self.text_height(self.display_text(row, matcher), font, width)
+
+    def text_height(self, text, font, width):
+        # 纯 ASCII 且可见的各行都不需要折行时，行数 × 行高即为结果，省去 QTextLayout 排版
+        if text.isascii() and "\t" not in text:
+            cached = self.metrics.get(font.key())
+            if cached is None:
+                fm = QFontMetricsF(font)
+                # QTextLine.height() 向上取整到整数像素
+                cached = self.metrics[font.key()] = (fm, math.ceil(fm.ascent() + fm.descent()),
+                                                     min(fm.horizontalAdvance(chr(c)) for c in range(33, 127)))
+            fm, line_h, min_adv = cached
+            max_lines = math.ceil(self.MAX_HEIGHT / line_h)
+            visible = text.split("\n", max_lines)[:max_lines]
+            # 排版时字形宽度取整会略有出入，留出一个平均字符宽度的余量
+            limit = width - fm.averageCharWidth()
+            # 字符数已注定放不下的行不必再量宽度
+            if all(len(line) * min_adv <= limit and fm.horizontalAdvance(line) <= limit for line in visible):
+                return len(visible) * line_h
+        return self.build_layout(text, font, width)[1]
+
+    def thumb_size(self, row):
+        w, h = row.get('width'), row.get('height')
+        if not w or not h:
+            pix = self.load_thumbnail(row)
+            return pix.size() if pix else QSize(0, 0)
+        size = QSize(w, h)
+        if size.height() > THUMB_MAX_HEIGHT:
+            size = QSize(max(1, w * THUMB_MAX_HEIGHT // h), THUMB_MAX_HEIGHT)
+        if size.width() > THUMB_MAX_WIDTH:
+            size = QSize(THUMB_MAX_WIDTH, max(1, size.height() * THUMB_MAX_WIDTH // size.width()))
+        return size
+
+    def load_thumbnail(self, row):
+        blob_hash = row.get('blob_hash')
+        if not blob_hash: return None
+        pix = thumb_cache.get(blob_hash)
+        if pix is None:
+            data = self.db.get_thumb(blob_hash, self.writer.save_thumb)
+            if not data: return None
+            pix = QPixmap()
+            if not pix.loadFromData(data): return None
+            thumb_cache.put(blob_hash, pix)
+        return pix
+
+    def file_icon(self, path):
+        return self.icons.icon(path)
+
+    def display_text(self, row, matcher):
+        if not matcher:
+            text = preview_text(row)[:self.MAX_TEXT_CHARS]
+            return text.replace("\r\n", "\n").replace("\r", "\n")
+        # 超长内容的命中可能在很后面，摘要按查询缓存，重绘时不必再扫描全文
+        key = (row['id'], matcher.query)
+        text = self.snippets.get(key)
+        if text is None:
+            text = preview_text(row)
+            if row['content_text'] is None and row.get('content_head') and not matcher.pattern.search(text):
+                # 压缩存储的长文本，命中在预览前缀之后：读取完整正文截取摘要（随摘要一起缓存）
+                text = self.db.get_text(row['id']) or text
+            text = matcher.snippet(text, self.MAX_TEXT_CHARS)
+            text = text.replace("\r\n", "\n").replace("\r", "\n")
+            self.snippets[key] = text
+            if len(self.snippets) > self.SNIPPET_CACHE_LIMIT: self.snippets.popitem(last=False)
+        else:
+            self.snippets.move_to_end(key)
+        return text
+
+    def highlight_formats(self, text, matcher):
+        if not matcher: return []
+        fmt = QTextCharFormat()
+        fmt.setBackground(QColor("#FFEB3B"))
+        fmt.setForeground(QColor("black"))
+        formats = []
+        for start, end in matcher.spans(text):
+            r = QTextLayout.FormatRange()
+            r.start, r.length, r.format = start, end - start, fmt
+            formats.append(r)
+        return formats
+
+    def build_layout(self, text, font, width, formats=None):
+        # 换行符转换为 Unicode 行分隔符，QTextLayout 才会强制换行
+        layout = QTextLayout(text.replace("\n", "\u2028"), font)
+        opt = QTextOption()
+        opt.setWrapMode(QTextOption.WrapMode.WrapAtWordBoundaryOrAnywhere)
+        layout.setTextOption(opt)
+        if formats: layout.setFormats(formats)
+        layout.beginLayout()
+        y = 0.0
+        # 超出最大行高的部分不可见，无需继续排版
+        while y < self.MAX_HEIGHT:
+            line = layout.createLine()
+            if not line.isValid(): break
+            line.setLineWidth(max(1, width))
+            line.setPosition(QPointF(0, y))
+            y += line.height()
+        layout.endLayout()
+        return layout, int(y + 0.999)
+
+    @perf.timed("render_content")
+    def paint(self, painter, option, index):
+        row = index.data(HistoryModel.RowRole)
+        matcher = index.model().matcher
+        if (row['id'], matcher.query) in self.pending: self.remeasure((row['id'], matcher.query))
+        painter.save()
+
+        m = self.MARGIN
+        frame = option.rect.adjusted(m, m, -m, -m)
+        hovered = bool(option.state & QStyle.StateFlag.State_MouseOver)
+        selected = bool(option.state & QStyle.StateFlag.State_Selected)
+        type_color = self.get_color_by_type(row['type'])
+
+        painter.fillRect(frame, self.colors['hover_bg'] if hovered else self.colors['bg'])
+        painter.setPen(type_color if (hovered or selected) else self.colors['border'])
+        painter.drawRect(frame.adjusted(0, 0, -1, -1))
+        painter.fillRect(QRect(frame.left() + 1, frame.top() + 1, self.STRIP_WIDTH, frame.height() - 2), type_color)
+
+        content = self.content_rect(option.rect)
+        painter.setClipRect(content)
+        painter.setPen(self.colors['text'])
+
+        pix = self.load_thumbnail(row) if row.get('blob_hash') else None
+        if pix:
+            painter.drawPixmap(content.topLeft(), pix)
+        elif row['type'] == 'file':
+            filename, path = file_label(row)
+            icon_rect = QRect(content.left(), content.center().y() - 14, 28, 28)
+            painter.drawPixmap(icon_rect, self.file_icon(path))
+            text_w = content.width() - self.ICON_BOX
+            layout, text_h = self.build_layout(filename, option.font, text_w,
+                                               self.highlight_formats(filename, matcher))
+            top = content.top() + max(0, (content.height() - text_h) // 2)
+            layout.draw(painter, QPointF(content.left() + self.ICON_BOX, top))
         else:
-            self.content_lbl.setTextFormat(Qt.TextFormat.PlainText)
-        self.content_lbl.setText(display_text)
-        self.content_lbl.setWordWrap(True)
-        self.content_lbl.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Minimum)
-
-    def highlight_text(self, text):
-        return re.sub(f"({re.escape(self.search_keyword)})", 
-                      r"<span style='background-color: #FFEB3B; color: black;'>\1</span>", 
-                      text, flags=re.IGNORECASE)
-
-    def get_required_height(self, width):
-        self.container.setFixedWidth(width - 10) 
-        self.container.layout().activate()
-        sh = self.sizeHint()
-        self.container.setMinimumWidth(0)
-        self.container.setMaximumWidth(16777215)
-        return min(sh.height(), self.MAX_HEIGHT)
+            text = self.display_text(row, matcher)
+            layout, _ = self.build_layout(text, option.font, content.width(),
+                                          self.highlight_formats(text, matcher))
+            layout.draw(painter, QPointF(content.topLeft()))
+
+        painter.restore()
 
 # ==========================================
 # 4. 主窗口
 # ==========================================
 class ClipboardManager(QMainWindow):
     REG_APP_NAME = "MyClipboardTool"
+    DEFAULTS = {
+        'max_items': 100, 'max_mb': 500, 'max_days': 0, 'hotkey': "Ctrl+Shift+V",
+        'capture_text_mb': 16, 'capture_image_mp': 24, 'capture_image_preview': False,
+        'image_codec': 'auto', 'perf_enabled': False,
+    }
 
-    def __init__(self):
+    def __init__(self, db_name="clipboard.db"):
         super().__init__()
-        self.db = DBManager()
+        self.db = DBManager(db_name, defer_init=True)
         self.settings = QSettings("MyTools", "ClipboardManager")
         
         self.setMinimumSize(350, 450)
@@ -394,16 +2090,25 @@ class ClipboardManager(QMainWindow):
         self.setAttribute(Qt.WidgetAttribute.WA_TranslucentBackground)
         self.setMouseTracking(True)
         
-        self.is_light_theme = True
+        self.is_light_theme = 6 <= datetime.datetime.now().hour < 18
+        self.applied_theme = None
         self.last_switch_key = ""
-        
+        self.show_requested_at = None
+        perf.enabled = self.setting("perf_enabled")
+
+        # 分阶段启动：托盘、剪贴板监听与热键最先就绪；设置页、主题图标留到事件循环空闲时逐项完成，
+        # 首次唤出前剩余的阶段会立即补完。首屏列表等写线程初始化数据库后由 database_ready 触发填充
+        global_signals.database_ready.connect(self.init_history_list)
+        global_signals.database_failed.connect(self.on_database_failed)
         self.tray = QSystemTrayIcon(self)
-        self.init_ui_elements()
         self.init_tray()
         self.init_clipboard_monitor()
         self.update_hotkey()
-        
-        self.init_startup_theme()
+        self.file_icon_thread = FileIconThread()
+        self.file_icon_thread.start()
+        self.init_ui_elements()
+        self.startup_stages = deque([self.init_startup_theme, self.init_settings_page, self.prewarm_layout])
+        QTimer.singleShot(0, self.run_startup_stage)
         
         self.theme_timer = QTimer(self)
         self.theme_timer.timeout.connect(self.check_scheduled_theme_switch)
@@ -411,11 +2116,60 @@ class ClipboardManager(QMainWindow):
         
         self.search_timer = QTimer(self)
         self.search_timer.setSingleShot(True)
-        self.search_timer.setInterval(300)
+        # 结果有缓存且能增量细化，几乎不需要防抖
+        self.search_timer.setInterval(30)
         self.search_timer.timeout.connect(self.refresh_list)
 
-        self.refresh_list()
+        # 隐藏期间视图不会执行延迟布局，列表变化后在后台补做，唤出时无需重排
+        self.prewarm_timer = QTimer(self)
+        self.prewarm_timer.setSingleShot(True)
+        self.prewarm_timer.setInterval(100)
+        self.prewarm_timer.timeout.connect(self.relayout_hidden_list)
+        for sig in (self.history_model.modelReset, self.history_model.rowsInserted,
+                    self.history_model.rowsRemoved, self.history_model.rowsMoved):
+            sig.connect(self.prewarm_timer.start)
+
         global_signals.database_changed.connect(self.on_database_changed)
+        global_signals.history_delta.connect(self.on_history_delta)
+
+    def setting(self, key):
+        default = self.DEFAULTS[key]
+        return self.settings.value(key, default, type(default))
+
+    def run_startup_stage(self):
+        if not self.startup_stages: return
+        stage = self.startup_stages.popleft()
+        with perf.span("startup_" + stage.__name__):
+            stage()
+        if self.startup_stages: QTimer.singleShot(0, self.run_startup_stage)
+
+    def finish_startup(self):
+        while self.startup_stages:
+            self.startup_stages.popleft()()
+
+    @perf.timed("startup_init_history_list")
+    def init_history_list(self):
+        self.refresh_list()
+        self.refresh_pinned_list()
+
+    def on_database_failed(self, message):
+        self.tray.showMessage("MyClip", f"无法打开数据库，历史记录不可用：{message}",
+                              QSystemTrayIcon.MessageIcon.Warning)
+
+    def prewarm_layout(self):
+        # 隐藏状态下按窗口尺寸完成布局与行高测量，热键唤出时只需移动并显示
+        # grab() 会先递归发送挂起的尺寸事件并激活各级布局，只渲染 1 像素
+        self.grab(QRect(0, 0, 1, 1))
+        self.relayout_hidden_list()
+
+    def relayout_hidden_list(self):
+        if self.isVisible(): return
+        viewport = self.list_widget.viewport()
+        width = viewport.width()
+        self.list_widget.doItemsLayout()
+        # 滚动条出现或消失会改变视口宽度，隐藏时视图收不到尺寸事件，需按新宽度再排一次
+        if viewport.width() != width:
+            self.list_widget.doItemsLayout()
 
     def init_startup_theme(self):
         hour = datetime.datetime.now().hour
@@ -436,18 +2190,29 @@ class ClipboardManager(QMainWindow):
             self.last_switch_key = current_key
 
     def set_theme(self, is_light):
-        self.is_light_theme = is_light
+        # 行由委托绘制，换肤只需替换委托的颜色表；样式表只作用于固定数量的控件
+        # 主题未变化时（启动阶段、定时检查）不再重新应用样式表
+        if is_light == self.applied_theme: return
+        self.applied_theme = self.is_light_theme = is_light
         self.setStyleSheet(LIGHT_STYLE if is_light else DARK_STYLE)
-        icon_color = "#333333" if is_light else "#e0e0e0"
-        self.update_icons(icon_color)
+        for view in (self.list_widget, self.list_pin):
+            view.itemDelegate().set_light(is_light)
+            view.viewport().update()
+        self.update_icons(self.icon_color())
+
+    def icon_color(self):
+        return "#333333" if self.is_light_theme else "#e0e0e0"
 
     def update_icons(self, color_hex):
-        self.btn_search.setIcon(create_tinted_icon(get_asset_path("search.svg"), color_hex))
-        self.btn_pin.setIcon(create_tinted_icon(get_asset_path("pin.svg"), color_hex))
-        self.btn_settings.setIcon(create_tinted_icon(get_asset_path("set.svg"), color_hex))
-        close_color = "#555555" if self.is_light_theme else "#cccccc" 
-        self.btn_close.setIcon(create_tinted_icon(get_asset_path("x.svg"), close_color))
-        
+        close_color = "#555555" if self.is_light_theme else "#cccccc"
+        for btn, svg, color in ((self.btn_search, "search.svg", color_hex), (self.btn_pin, "pin.svg", color_hex),
+                                (self.btn_settings, "set.svg", color_hex), (self.btn_close, "x.svg", close_color)):
+            size = btn.iconSize() * self.devicePixelRatioF()
+            icon = create_tinted_icon(get_asset_path(svg), color, (size.width(), size.height()))
+            btn.setIcon(icon)
+        self.update_tray_icon(color_hex)
+
+    def update_tray_icon(self, color_hex):
         tray_icon = create_tinted_icon(get_asset_path("myclip.svg"), color_hex)
         if not tray_icon.isNull():
             self.tray.setIcon(tray_icon)
@@ -527,18 +2292,16 @@ class ClipboardManager(QMainWindow):
         self.search_input.setVisible(False)
         layout_list.addWidget(self.search_input)
         
-        self.list_widget = QListWidget()
-        self.list_widget.setSpacing(0) 
-        self.list_widget.setResizeMode(QListWidget.ResizeMode.Adjust)
-        self.list_widget.setVerticalScrollMode(QAbstractItemView.ScrollMode.ScrollPerPixel)
-        self.list_widget.setUniformItemSizes(False)
-        self.list_widget.itemDoubleClicked.connect(self.on_item_double_click)
+        self.history_model = HistoryModel(self.db, parent=self)
+        self.list_widget = self.create_list_view(self.history_model)
+        self.list_widget.doubleClicked.connect(self.on_item_double_click)
         self.list_widget.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
         self.list_widget.customContextMenuRequested.connect(self.show_context_menu)
-        self.list_widget.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
         
         # 安装事件过滤器以支持回车键粘贴
         self.list_widget.installEventFilter(self)
+        # 记录唤出后的首次绘制时间
+        self.list_widget.viewport().installEventFilter(self)
         
         layout_list.addWidget(self.list_widget)
         self.stack.addWidget(self.page_list_container)
@@ -547,14 +2310,11 @@ class ClipboardManager(QMainWindow):
         self.page_pin = QWidget()
         layout_pin = QVBoxLayout(self.page_pin)
         layout_pin.setContentsMargins(0, 0, 0, 0)
-        self.list_pin = QListWidget()
-        self.list_pin.setSpacing(0)
-        self.list_pin.setResizeMode(QListWidget.ResizeMode.Adjust)
-        self.list_pin.setVerticalScrollMode(QAbstractItemView.ScrollMode.ScrollPerPixel)
-        self.list_pin.itemDoubleClicked.connect(self.on_item_double_click)
+        self.pinned_model = HistoryModel(self.db, only_pinned=True, parent=self)
+        self.list_pin = self.create_list_view(self.pinned_model)
+        self.list_pin.doubleClicked.connect(self.on_item_double_click)
         self.list_pin.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
         self.list_pin.customContextMenuRequested.connect(lambda p: self.show_context_menu(p, is_pinned_page=True))
-        self.list_pin.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
         
         # 安装事件过滤器以支持回车键粘贴
         self.list_pin.installEventFilter(self)
@@ -562,7 +2322,18 @@ class ClipboardManager(QMainWindow):
         layout_pin.addWidget(self.list_pin)
         self.stack.addWidget(self.page_pin)
 
-        # Settings Page
+        # 设置页在启动空闲阶段或首次打开时才构建
+        self.settings_scroll = QScrollArea()
+        self.settings_scroll.setWidgetResizable(True)
+        self.settings_scroll.setFrameShape(QScrollArea.Shape.NoFrame)
+        self.settings_scroll.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+        self.stack.addWidget(self.settings_scroll)
+
+        self.main_layout.addWidget(self.stack)
+        self.btn_search.setChecked(True)
+        self.stack.setCurrentIndex(0)
+
+    def init_settings_page(self):
         self.page_settings = QWidget()
         layout_set = QVBoxLayout(self.page_settings)
         layout_set.setContentsMargins(10, 5, 10, 5)
@@ -574,15 +2345,36 @@ class ClipboardManager(QMainWindow):
         row1.addWidget(QLabel("最大历史条数(10-500):"))
         self.spin_max_items = QSpinBox()
         self.spin_max_items.setRange(10, 500)
-        self.spin_max_items.setValue(self.settings.value("max_items", 100, int))
+        self.spin_max_items.setValue(self.setting("max_items"))
         self.spin_max_items.valueChanged.connect(lambda v: self.settings.setValue("max_items", v))
+        self.spin_max_items.valueChanged.connect(self.apply_retention_policy)
         row1.addWidget(self.spin_max_items)
         layout_gen.addLayout(row1)
 
+        row_size = QHBoxLayout()
+        row_size.addWidget(QLabel("历史总大小上限(MB):"))
+        self.spin_max_mb = QSpinBox()
+        self.spin_max_mb.setRange(10, 10000)
+        self.spin_max_mb.setValue(self.setting("max_mb"))
+        self.spin_max_mb.valueChanged.connect(lambda v: self.settings.setValue("max_mb", v))
+        self.spin_max_mb.valueChanged.connect(self.apply_retention_policy)
+        row_size.addWidget(self.spin_max_mb)
+        layout_gen.addLayout(row_size)
+
+        row_age = QHBoxLayout()
+        row_age.addWidget(QLabel("保留天数(0为不限):"))
+        self.spin_max_days = QSpinBox()
+        self.spin_max_days.setRange(0, 3650)
+        self.spin_max_days.setValue(self.setting("max_days"))
+        self.spin_max_days.valueChanged.connect(lambda v: self.settings.setValue("max_days", v))
+        self.spin_max_days.valueChanged.connect(self.apply_retention_policy)
+        row_age.addWidget(self.spin_max_days)
+        layout_gen.addLayout(row_age)
+
         row2 = QHBoxLayout()
         row2.addWidget(QLabel("显示热键:"))
         self.key_edit = QKeySequenceEdit()
-        self.key_edit.setKeySequence(QKeySequence(self.settings.value("hotkey", "Ctrl+Shift+V")))
+        self.key_edit.setKeySequence(QKeySequence(self.setting("hotkey")))
         self.key_edit.editingFinished.connect(self.on_hotkey_changed)
         row2.addWidget(self.key_edit)
         layout_gen.addLayout(row2)
@@ -593,6 +2385,49 @@ class ClipboardManager(QMainWindow):
         layout_gen.addWidget(self.check_autostart)
         layout_set.addWidget(grp_general)
 
+        grp_capture = QGroupBox("采集限制")
+        layout_cap = QVBoxLayout(grp_capture)
+        row_text = QHBoxLayout()
+        row_text.addWidget(QLabel("文本上限(MB，超出截断):"))
+        self.spin_capture_text_mb = QSpinBox()
+        self.spin_capture_text_mb.setRange(1, 1024)
+        self.spin_capture_text_mb.setValue(self.setting("capture_text_mb"))
+        self.spin_capture_text_mb.valueChanged.connect(lambda v: self.settings.setValue("capture_text_mb", v))
+        self.spin_capture_text_mb.valueChanged.connect(self.apply_capture_policy)
+        row_text.addWidget(self.spin_capture_text_mb)
+        layout_cap.addLayout(row_text)
+
+        row_image = QHBoxLayout()
+        row_image.addWidget(QLabel("图片上限(百万像素):"))
+        self.spin_capture_image_mp = QSpinBox()
+        self.spin_capture_image_mp.setRange(1, 500)
+        self.spin_capture_image_mp.setValue(self.setting("capture_image_mp"))
+        self.spin_capture_image_mp.valueChanged.connect(lambda v: self.settings.setValue("capture_image_mp", v))
+        self.spin_capture_image_mp.valueChanged.connect(self.apply_capture_policy)
+        row_image.addWidget(self.spin_capture_image_mp)
+        layout_cap.addLayout(row_image)
+
+        self.check_image_preview = QCheckBox("超出上限的图片只保存预览图（否则缩小后保存）")
+        self.check_image_preview.setChecked(self.setting("capture_image_preview"))
+        self.check_image_preview.toggled.connect(lambda v: self.settings.setValue("capture_image_preview", v))
+        self.check_image_preview.toggled.connect(self.apply_capture_policy)
+        layout_cap.addWidget(self.check_image_preview)
+
+        row_codec = QHBoxLayout()
+        row_codec.addWidget(QLabel("图片编码:"))
+        self.combo_image_codec = QComboBox()
+        for codec, label in zip(IMAGE_CODECS, ["自动", "PNG（快速）", "PNG", "WebP 无损", "原始像素"]):
+            if codec == 'webp' and not webp_supported(): continue
+            self.combo_image_codec.addItem(label, codec)
+        self.combo_image_codec.setCurrentIndex(max(0, self.combo_image_codec.findData(
+            self.setting("image_codec"))))
+        self.combo_image_codec.currentIndexChanged.connect(
+            lambda: self.settings.setValue("image_codec", self.combo_image_codec.currentData()))
+        self.combo_image_codec.currentIndexChanged.connect(self.apply_capture_policy)
+        row_codec.addWidget(self.combo_image_codec)
+        layout_cap.addLayout(row_codec)
+        layout_set.addWidget(grp_capture)
+
         grp_action = QGroupBox("操作")
         layout_act = QVBoxLayout(grp_action)
         btn_theme = QPushButton("手动切换主题")
@@ -606,35 +2441,110 @@ class ClipboardManager(QMainWindow):
         btn_clear_db.clicked.connect(self.clear_database)
         layout_act.addWidget(btn_clear_db)
         layout_set.addWidget(grp_action)
-        layout_set.addStretch()
-        self.stack.addWidget(self.page_settings)
 
-        self.main_layout.addWidget(self.stack)
-        self.btn_search.setChecked(True)
-        self.stack.setCurrentIndex(0)
+        grp_diag = QGroupBox("诊断")
+        layout_diag = QVBoxLayout(grp_diag)
+        self.check_perf = QCheckBox("记录性能数据")
+        self.check_perf.setChecked(self.setting("perf_enabled"))
+        self.check_perf.toggled.connect(self.set_perf_enabled)
+        layout_diag.addWidget(self.check_perf)
+        self.lbl_perf = QLabel("")
+        self.lbl_perf.setTextInteractionFlags(Qt.TextInteractionFlag.TextSelectableByMouse)
+        self.lbl_perf.setStyleSheet("font-family: Consolas, monospace; font-size: 11px;")
+        self.lbl_perf.setWordWrap(True)
+        layout_diag.addWidget(self.lbl_perf)
+        row_diag = QHBoxLayout()
+        btn_perf_refresh = QPushButton("刷新")
+        btn_perf_refresh.setObjectName("ActionBtn")
+        btn_perf_refresh.clicked.connect(self.update_perf_panel)
+        row_diag.addWidget(btn_perf_refresh)
+        btn_perf_export = QPushButton("导出...")
+        btn_perf_export.setObjectName("ActionBtn")
+        btn_perf_export.clicked.connect(self.export_perf_trace)
+        row_diag.addWidget(btn_perf_export)
+        btn_perf_reset = QPushButton("清零")
+        btn_perf_reset.setObjectName("ActionBtn")
+        btn_perf_reset.clicked.connect(lambda: (perf.reset(), self.update_perf_panel()))
+        row_diag.addWidget(btn_perf_reset)
+        layout_diag.addLayout(row_diag)
+        layout_set.addWidget(grp_diag)
+        layout_set.addStretch()
+        # 诊断信息较长时设置页可以滚动
+        self.settings_scroll.setWidget(self.page_settings)
+
+    def create_list_view(self, model):
+        view = QListView()
+        view.setModel(model)
+        view.setItemDelegate(ClipItemDelegate(self.db, self.db_writer, self.file_icon_thread, view))
+        # 后台取得的文件图标到达后重绘
+        self.file_icon_thread.sig_loaded.connect(lambda *_: view.viewport().update())
+        view.setSpacing(0)
+        view.setResizeMode(QListView.ResizeMode.Adjust)
+        view.setVerticalScrollMode(QAbstractItemView.ScrollMode.ScrollPerPixel)
+        view.setUniformItemSizes(False)
+        view.setMouseTracking(True)
+        view.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+        # 接近底部时提前加载下一页（视图自身只在滚到最底时才调用 fetchMore）
+        view.verticalScrollBar().valueChanged.connect(lambda v, view=view: self.on_list_scrolled(view, v))
+        return view
+
+    def on_list_scrolled(self, view, value):
+        model = view.model()
+        if model.canFetchMore() and value >= view.verticalScrollBar().maximum() - view.viewport().height():
+            model.fetchMore()
 
     # ==========================================
     # [NEW] 事件过滤器：处理回车键粘贴
     # ==========================================
     def eventFilter(self, source, event):
+        if self.show_requested_at is not None and event.type() == QEvent.Type.Paint \
+                and source is self.list_widget.viewport():
+            if perf.enabled:
+                perf.record("hotkey_to_paint", self.show_requested_at, time.perf_counter() - self.show_requested_at)
+            self.show_requested_at = None
         if event.type() == QEvent.Type.KeyPress and source in [self.list_widget, self.list_pin]:
             if event.key() in [Qt.Key.Key_Return, Qt.Key.Key_Enter]:
-                item = source.currentItem()
-                if item:
-                    self.on_item_double_click(item)
+                index = source.currentIndex()
+                if index.isValid():
+                    self.on_item_double_click(index)
                     return True
         return super().eventFilter(source, event)
 
+    def set_perf_enabled(self, checked):
+        perf.enabled = checked
+        self.settings.setValue("perf_enabled", checked)
+        self.update_perf_panel()
+
+    def update_perf_panel(self):
+        if not perf.enabled:
+            self.lbl_perf.setText("未启用")
+            return
+        summary = perf.summary()
+        lines = [f"{name:<20} n={s['count']:<6} p50≤{s['p50_ms']}ms p99≤{s['p99_ms']}ms max={s['max_ms']}ms"
+                 for name, s in summary['spans'].items()]
+        lines += [f"{name:<20} {n}" for name, n in sorted(summary['counters'].items())]
+        self.lbl_perf.setText("\n".join(lines) or "暂无数据")
+
+    def export_perf_trace(self):
+        path, _ = QFileDialog.getSaveFileName(self, "导出性能数据", "myclip-trace.json", "JSON (*.json)")
+        if not path: return
+        try:
+            perf.export_trace(path)
+        except OSError as e:
+            print(f"Export Error: {e}")
+
     def is_autostart_enabled(self):
+        if winreg is None: return False
         try:
             key = winreg.OpenKey(winreg.HKEY_CURRENT_USER, r"Software\Microsoft\Windows\CurrentVersion\Run", 0, winreg.KEY_READ)
             winreg.QueryValueEx(key, self.REG_APP_NAME)
             winreg.CloseKey(key)
             return True
-        except WindowsError:
+        except OSError:
             return False
 
     def set_autostart(self, checked):
+        if winreg is None: return
         try:
             key = winreg.OpenKey(winreg.HKEY_CURRENT_USER, r"Software\Microsoft\Windows\CurrentVersion\Run", 0, winreg.KEY_WRITE)
             if checked:
@@ -645,7 +2555,7 @@ class ClipboardManager(QMainWindow):
                 winreg.SetValueEx(key, self.REG_APP_NAME, 0, winreg.REG_SZ, app_path)
             else:
                 try: winreg.DeleteValue(key, self.REG_APP_NAME)
-                except WindowsError: pass
+                except OSError: pass
             winreg.CloseKey(key)
         except Exception as e:
             print(f"AutoStart Registry Error: {e}")
@@ -676,10 +2586,6 @@ class ClipboardManager(QMainWindow):
         if edges: self.setCursor(Qt.CursorShape.SizeAllCursor)
         else: self.setCursor(Qt.CursorShape.ArrowCursor)
 
-    def resizeEvent(self, event):
-        super().resizeEvent(event)
-        QTimer.singleShot(10, self.update_all_list_item_sizes)
-
     def changeEvent(self, event):
         if event.type() == QEvent.Type.ActivationChange:
             if self.isActiveWindow(): 
@@ -711,7 +2617,8 @@ class ClipboardManager(QMainWindow):
             QTimer.singleShot(0, self.list_widget.scrollToTop)
         elif index == 1: 
             self.refresh_pinned_list()
-        QTimer.singleShot(50, self.update_all_list_item_sizes)
+        elif index == 2:
+            self.update_perf_panel()
 
     def update_all_list_item_sizes(self):
         current_list = None
@@ -721,48 +2628,41 @@ class ClipboardManager(QMainWindow):
             current_list = self.list_pin
         
         if not current_list or not current_list.isVisible(): return
-        viewport_width = current_list.viewport().width()
-        if viewport_width <= 0: return
-
-        for i in range(current_list.count()):
-            item = current_list.item(i)
-            widget = current_list.itemWidget(item)
-            if widget:
-                new_height = widget.get_required_height(viewport_width)
-                current_size = item.sizeHint()
-                if current_size.height() != new_height or current_size.width() != viewport_width:
-                    item.setSizeHint(QSize(viewport_width, new_height))
+        # 行高由委托按宽度缓存，这里只需让视图重新布局
         current_list.doItemsLayout()
 
     def on_database_changed(self, change_type):
         if change_type in ['history', 'all']:
+            self.hot_tier.clear()
+            self.history_model.clear_cache()
             self.refresh_list()
         if change_type in ['pinned', 'all']:
             self.refresh_pinned_list()
 
+    def on_history_delta(self, op, item_id):
+        if op == 'delete': self.hot_tier.discard(item_id)
+        for view in (self.list_widget, self.list_pin):
+            self.keep_scroll_anchor(view, lambda v=view: v.model().apply_delta(op, item_id))
+
+    def keep_scroll_anchor(self, view, apply):
+        # 列表已滚动时，以视口顶部的行为锚点，变更后恢复其位置，避免内容跳动
+        bar = view.verticalScrollBar()
+        anchor = view.indexAt(QPoint(0, 0)) if bar.value() > 0 else QModelIndex()
+        if not anchor.isValid():
+            apply()
+            return
+        anchor = QPersistentModelIndex(anchor)
+        offset = view.visualRect(QModelIndex(anchor)).top()
+        apply()
+        if anchor.isValid():
+            view.doItemsLayout()
+            bar.setValue(bar.value() + view.visualRect(QModelIndex(anchor)).top() - offset)
+
     def refresh_list(self):
-        query = self.search_input.text()
-        items = self.db.get_items(limit=self.spin_max_items.value(), search_query=query, only_pinned=False)
-        self.populate_list(self.list_widget, items, query)
+        self.history_model.load(self.search_input.text())
 
     def refresh_pinned_list(self):
-        items = self.db.get_items(limit=1000, only_pinned=True)
-        self.populate_list(self.list_pin, items, "")
-
-    def populate_list(self, list_widget, items, query):
-        list_widget.setUpdatesEnabled(False)
-        list_widget.clear()
-        viewport_width = list_widget.viewport().width()
-        if viewport_width <= 0: viewport_width = 300
-
-        for row in items:
-            item = QListWidgetItem(list_widget)
-            widget = ClipboardItemWidget(dict(row), query)
-            list_widget.setItemWidget(item, widget)
-            height = widget.get_required_height(viewport_width)
-            item.setSizeHint(QSize(viewport_width, height))
-            
-        list_widget.setUpdatesEnabled(True)
+        self.pinned_model.load()
 
     def on_search_text_changed(self, text):
         self.search_timer.start()
@@ -771,91 +2671,105 @@ class ClipboardManager(QMainWindow):
         self.clipboard = QApplication.clipboard()
         self.clipboard.dataChanged.connect(self.on_clipboard_change)
         self.is_pasting = False
-
+        self.hot_tier = HotTier()
+        self.db_writer = DBWriterThread(self.db, self.hot_tier)
+        self.db_writer.start()
+        self.image_recompressor = ImageRecompressThread(self.db)
+        self.image_recompressor.start(QThread.Priority.LowestPriority)
+        self.capture_worker = CaptureWorker(self.db_writer, self.image_recompressor)
+        self.capture_worker.start()
+        QApplication.instance().aboutToQuit.connect(self.stop_workers)
+        self.apply_retention_policy()
+        self.apply_capture_policy()
+        # 按天数过期的记录即使没有新写入也需要定期清理
+        self.retention_timer = QTimer(self)
+        self.retention_timer.timeout.connect(self.apply_retention_policy)
+        self.retention_timer.start(3600 * 1000)
+
+    def apply_retention_policy(self):
+        # 设置控件可能尚未构建，统一从 QSettings 读取
+        self.db_writer.set_policy(self.setting("max_items"),
+                                  self.setting("max_mb") * 1024 * 1024,
+                                  self.setting("max_days"))
+
+    def apply_capture_policy(self):
+        self.capture_worker.set_policy(CapturePolicy(
+            max_text_bytes=self.setting("capture_text_mb") * 1024 * 1024,
+            max_image_pixels=self.setting("capture_image_mp") * 1000 * 1000,
+            image_preview_only=self.setting("capture_image_preview"),
+            image_codec=self.setting("image_codec")))
+
+    def stop_workers(self):
+        # 先停采集线程，保证已编码的条目都进入写队列后再停写线程
+        self.capture_worker.stop()
+        self.image_recompressor.stop()
+        self.db_writer.stop()
+        self.file_icon_thread.stop()
+
+    @perf.timed("on_clipboard_change")
     def on_clipboard_change(self):
         if self.is_pasting: return
-        mime = self.clipboard.mimeData()
-        
-        db_type, text, html, blob, path = 'text', None, None, None, None
-        h_val = ""
-        
         try:
-            if mime.hasUrls() and mime.urls() and mime.urls()[0].isLocalFile():
-                db_type, path = 'file', mime.urls()[0].toLocalFile()
-                h_val = str(hash(path))
-            elif mime.hasText():
-                db_type = 'text'
-                text = mime.text()
-                if not text: return
-                if mime.hasHtml(): 
-                    db_type = 'html'
-                    html = mime.html()
-                h_val = str(hash(text))
-                if mime.hasImage():
-                    img = mime.imageData()
-                    if img:
-                        ba = QBuffer()
-                        ba.open(QIODevice.OpenModeFlag.WriteOnly)
-                        img.save(ba, "PNG")
-                        blob = ba.data().data()
-            elif mime.hasImage():
-                db_type = 'image'
-                img = mime.imageData()
-                if img:
-                    ba = QBuffer()
-                    ba.open(QIODevice.OpenModeFlag.WriteOnly)
-                    img.save(ba, "PNG")
-                    blob = ba.data().data()
-                    h_val = str(hash(blob))
-            else: return
-
-            if h_val:
-                self.db.add_item(db_type, text, html, blob, path, h_val, emit_signal=True)
-        except Exception: pass
-
-    def on_item_double_click(self, item):
-        widget = self.list_widget.itemWidget(item) or self.list_pin.itemWidget(item)
-        if widget:
-            self.do_paste(widget.data)
+            snapshot = self.snapshot_mime(self.clipboard.mimeData())
+        except Exception: return
+        if snapshot: self.capture_worker.submit(snapshot)
+
+    def snapshot_mime(self, mime):
+        # 界面线程只复制剪贴板数据，编码与写库交给后台线程
+        paths = [url.toLocalFile() for url in mime.urls() if url.isLocalFile()] if mime.hasUrls() else []
+        if paths:
+            return {'type': 'file', 'paths': paths}
+        if mime.hasText():
+            # 文本里附带的图片（如表格截图）不再解码和编码；超长文本立即截断，尽早释放原始数据
+            policy = self.capture_worker.policy
+            text = mime.text()
+            if not text: return None
+            snapshot = {'type': 'text', 'text': policy.clip_text(text)}
+            if mime.hasHtml() and policy.text_fits(text):
+                html = mime.html()
+                # HTML 通常比纯文本大得多，超限时只保留纯文本
+                if policy.text_fits(html): snapshot.update(type='html', html=html)
+            return snapshot
+        if mime.hasImage():
+            img = mime.imageData()
+            return {'type': 'image', 'image': img} if img else None
+        return None
+
+    def on_item_double_click(self, index):
+        row = index.data(HistoryModel.RowRole)
+        if row:
+            self.do_paste(row)
 
     # ==========================================
     # [MODIFIED] 增加 as_plain_text 参数
     # ==========================================
+    @perf.timed("do_paste")
     def do_paste(self, row, as_plain_text=False):
         # ========================================================
         # 极速粘贴逻辑 (Zero-Latency Paste)
         # ========================================================
         
+        # 最近的条目直接取内存中的内容；其余按需读库解码后放入热缓存，再次粘贴时不再访问数据库
+        item_id = row['id']
+        payload = self.hot_tier.get(item_id)
+        if payload is None:
+            full_row = self.db.get_item(item_id)
+            if not full_row: return
+            payload = HotTier.from_item(full_row)
+            self.hot_tier.put(item_id, payload)
+
         # 1. 立即隐藏窗口
         self.hide()
         QApplication.processEvents()
 
         # 2. 设置剪贴板
         self.is_pasting = True
-        new_mime = QMimeData()
-        
-        # 如果强制纯文本，或者原本就是文本类型且没有其他特殊格式
-        if as_plain_text:
-             new_mime.setText(row['content_text'])
-        else:
-            if row['type'] == 'text': 
-                new_mime.setText(row['content_text'])
-            elif row['type'] == 'html': 
-                new_mime.setHtml(row['content_html'])
-                new_mime.setText(row['content_text'])
-            elif row['type'] == 'image': 
-                if row['content_blob']:
-                    img = QImage.fromData(row['content_blob'])
-                    new_mime.setImageData(img)
-            elif row['type'] == 'file':
-                url = QUrl.fromLocalFile(row['content_text'])
-                new_mime.setUrls([url])
-
-        QApplication.clipboard().setMimeData(new_mime)
+        QApplication.clipboard().setMimeData(HotTier.mime(payload, as_plain_text))
         
         # 3. 模拟粘贴按键 (Ctrl + V)
         time.sleep(0.05) 
-        if sys.platform.startswith('win'):
+        win32api, win32con = load_win32() if sys.platform.startswith('win') else (None, None)
+        if win32api:
             try:
                 win32api.keybd_event(win32con.VK_CONTROL, 0, 0, 0)
                 win32api.keybd_event(ord('V'), 0, 0, 0)
@@ -865,37 +2779,27 @@ class ClipboardManager(QMainWindow):
                 print(f"Paste Error: {e}")
 
         # 4. 延迟更新数据库与界面，确保粘贴动作流畅
-        QTimer.singleShot(500, lambda: self.deferred_update_after_paste(row))
-
-    def deferred_update_after_paste(self, row):
-        """延迟执行的后台任务：更新数据库顺序并重绘界面"""
-        self.db.add_item(
-            type_=row['type'],
-            text=row['content_text'] if row['type'] != 'file' else None,
-            html=row['content_html'],
-            blob=row['content_blob'],
-            filepath=row['content_text'] if row['type'] == 'file' else None,
-            hash_val=row['hash_val'],
-            emit_signal=False 
-        )
-        self.refresh_list()
+        QTimer.singleShot(500, lambda: self.deferred_update_after_paste(item_id))
+
+    def deferred_update_after_paste(self, item_id):
+        """延迟执行的后台任务：按 id 更新时间（由写线程提交），列表通过增量信号置顶该行"""
+        self.db_writer.touch(item_id)
         self.is_pasting = False
 
     def show_context_menu(self, position, is_pinned_page=False):
         s_list = self.list_pin if is_pinned_page else self.list_widget
-        item = s_list.itemAt(position)
-        if not item: return
-        widget = s_list.itemWidget(item)
-        if not widget: return
+        index = s_list.indexAt(position)
+        if not index.isValid(): return
+        row = index.data(HistoryModel.RowRole)
         
-        row_id = widget.data['id']
+        row_id = row['id']
         
         menu = QMenu()
         
         # ==========================================
         # [NEW] 增加“粘贴为纯文本”选项
         # ==========================================
-        if widget.data['type'] == 'html':
+        if row['type'] == 'html':
             act_plain = menu.addAction("粘贴为纯文本")
         else:
             act_plain = None
@@ -907,16 +2811,16 @@ class ClipboardManager(QMainWindow):
         action = menu.exec(s_list.mapToGlobal(position))
         
         if act_plain and action == act_plain:
-            self.do_paste(widget.data, as_plain_text=True)
+            self.do_paste(row, as_plain_text=True)
         elif action == act_pin:
-            self.db.set_pinned(row_id, not is_pinned_page)
+            self.db_writer.set_pinned(row_id, not is_pinned_page)
         elif action == act_del:
-            self.db.delete_item(row_id)
+            self.db_writer.delete_item(row_id)
         elif action == act_clear:
-            self.db.clear_all(False)
+            self.db_writer.clear_all(False)
 
     def clear_database(self):
-        self.db.clear_all(False)
+        self.db_writer.clear_all(False)
         
     def on_hotkey_changed(self):
         seq = self.key_edit.keySequence().toString()
@@ -924,7 +2828,7 @@ class ClipboardManager(QMainWindow):
         self.update_hotkey()
 
     def update_hotkey(self):
-        hk = self.settings.value("hotkey", "Ctrl+Shift+V")
+        hk = self.setting("hotkey")
         if hasattr(self, 'hk_thread'): 
             self.hk_thread.stop()
         self.hk_thread = NativeHotkeyThread(hk)
@@ -941,6 +2845,7 @@ class ClipboardManager(QMainWindow):
         menu.addAction("退出", QApplication.instance().quit)
         self.tray.setContextMenu(menu)
         self.tray.activated.connect(self.on_tray_activated)
+        self.update_tray_icon(self.icon_color())
         self.tray.show()
 
     def on_tray_activated(self, reason):
@@ -948,15 +2853,18 @@ class ClipboardManager(QMainWindow):
             self.toggle_visible()
             
     def open_settings_from_tray(self):
+        self.finish_startup()
         self.show()
         self.switch_tab(2) 
         self.activateWindow()
         self.raise_()
 
+    @perf.timed("toggle_visible")
     def toggle_visible(self):
         if self.isVisible(): 
             self.hide()
         else:
+            self.finish_startup()
             cp = QCursor.pos()
             screen = QApplication.screenAt(cp).availableGeometry()
             x = min(cp.x(), screen.right() - self.width())
@@ -964,29 +2872,70 @@ class ClipboardManager(QMainWindow):
             x = max(screen.left(), x)
             y = max(screen.top(), y)
             self.move(x, y)
-            
-            if self.stack.currentIndex() != 0:
-                self.switch_tab(0)
-            
-            if self.search_input.isVisible():
-                self.search_input.clear()
-                self.search_input.setVisible(False)
-                self.list_widget.setFocus()
-            
-            self.list_widget.scrollToTop()
-            if self.list_widget.count() > 0:
-                self.list_widget.setCurrentRow(0)
-                
+            self.show_requested_at = time.perf_counter()
+            # 界面状态已在隐藏时复位，列表也保持着布局，这里只需移动并显示
+            if self.history_model.rowCount() > 0:
+                self.list_widget.setCurrentIndex(self.history_model.index(0))
             self.show()
             self.activateWindow()
             self.raise_()
-            QTimer.singleShot(10, self.update_all_list_item_sizes) 
             self.list_widget.setFocus()
 
+    def handle_command(self, command, arg=""):
+        # InstanceChannel 收到的命令
+        if command in ('show', 'search'):
+            if not self.isVisible(): self.toggle_visible()
+            self.activateWindow()
+            self.raise_()
+            if command == 'search':
+                if self.stack.currentIndex() != 0: self.switch_tab(0)
+                self.search_input.setVisible(True)
+                self.search_input.setText(arg)
+                self.search_input.setFocus()
+        elif command == 'hide':
+            self.hide()
+        elif command == 'quit':
+            QApplication.instance().quit()
+
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        self.reset_popup_state()
+
+    def reset_popup_state(self):
+        # 隐藏后立即回到历史页、清空搜索并滚回顶部，重新加载也在隐藏期间完成
+        if self.stack.currentIndex() != 0:
+            self.switch_tab(0)
+        self.search_timer.stop()
+        if self.search_input.text():
+            self.search_input.blockSignals(True)
+            self.search_input.clear()
+            self.search_input.blockSignals(False)
+        self.search_input.setVisible(False)
+        if self.history_model.query:
+            self.refresh_list()
+        self.list_widget.scrollToTop()
+
 if __name__ == "__main__":
-    app = QApplication(sys.argv)
+    # 没有正在运行的实例（已在文件开头检查）：本进程成为唯一实例并接收后续命令
+    app = QApplication(sys.argv[:1])
     app.setQuitOnLastWindowClosed(False)
     os.environ["QT_ENABLE_HIGHDPI_SCALING"] = "1"
     os.environ["QT_SCALE_FACTOR"] = "1"
-    win = ClipboardManager()
-    sys.exit(app.exec())
\ No newline at end of file
+    # 上面的检查与开始监听之间有空档：同时启动的两个进程以锁文件为准，只有拿到锁并监听成功的一个继续运行，
+    # 另一个等对方开始监听后转发命令退出。锁只按持有进程是否存活判定失效，不按时间
+    lock = QLockFile(get_data_path(args.db) + ".lock")
+    lock.setStaleLockTime(0)
+    channel = InstanceChannel(channel_name)
+    if not (lock.tryLock(0) and channel.listen()):
+        exit_code = forward_command(channel_name, instance_command, retries=50)
+        if exit_code is None: print("错误：另一个实例正在运行但没有响应")
+        sys.exit(1 if exit_code is None else exit_code)
+    win = ClipboardManager(args.db)
+    channel.sig_command.connect(win.handle_command)
+    if args.command:
+        # 首次启动时显式给出的命令由本实例自己执行；不带命令启动（开机自启）时保持在托盘
+        command, _, arg = instance_command.partition(" ")
+        QTimer.singleShot(0, lambda: win.handle_command(command, arg))
+    exit_code = app.exec()
+    lock.unlock()
+    sys.exit(exit_code)
\ No newline at end of file